@@ -0,0 +1,296 @@
+import json
+import numpy as np
+
+from utils.utils import ordered_list_from_dict
+
+# Conventions shared by every function below, for a run over N nodes:
+# - parent[i] is the node that infected i, the seed is its own parent and unreached nodes hold -1.
+# - infection_round[i] is the round in which i was infected (seed = 0), -1 when never reached.
+# Functions accept a single run (shape (N,)) or a batch of runs over the same node count (shape (R, N)).
+
+DEFAULT_COVERAGE = (0.5, 0.9, 0.99, 1.0)
+# Smallest logit slope per round treated as growth by predict_remaining_rounds(), below it the fit is noise
+MIN_LOGIT_SLOPE = 1e-6
+
+
+def run_from_state_file(state_file: dict) -> dict:
+    """Extracts the parent and infection round arrays from a P2PService state file dict."""
+    gossipers = state_file['gossipers']
+    return {
+        'parent': np.asarray([int(parent) for parent in ordered_list_from_dict(gossipers, field='parent_node')], dtype=np.int64),
+        'infection_round': np.asarray(ordered_list_from_dict(gossipers, field='infection_round'), dtype=np.int64),
+    }
+
+
+def load_run(filepath: str) -> dict:
+    """Loads a single run from a JSON state file on disk."""
+    with open(filepath, 'r') as f:
+        return run_from_state_file(json.load(f))
+
+
+def iter_runs(filepath: str):
+    """
+    Streams runs from a JSON lines trace (one run per line, as written by `main.py sweep --trace`).
+    Only the run being yielded is held in memory.
+    """
+    with open(filepath, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record['parent'] = np.asarray(record['parent'], dtype=np.int64)
+            record['infection_round'] = np.asarray(record['infection_round'], dtype=np.int64)
+            yield record
+
+
+def infection_depth(parent) -> np.ndarray:
+    """
+    Hop distance from every node to the root of its infection tree, -1 for unreached nodes.
+
+    Uses pointer jumping: every pass adds the depth accumulated by the current ancestor and
+    jumps to the ancestor's ancestor, so a tree of depth D is resolved in ceil(log2(D)) + 1
+    vectorized passes.
+    """
+    parent = np.asarray(parent, dtype=np.int64)
+    index = np.broadcast_to(np.arange(parent.shape[-1]), parent.shape)
+    reached = parent >= 0
+    # Unreached nodes become their own root so the jumps never leave the array
+    ancestor = np.where(reached, parent, index)
+    depth = (ancestor != index).astype(np.int64)
+
+    for _ in range(max(1, int(np.ceil(np.log2(max(parent.shape[-1], 2)))) + 1)):
+        next_ancestor = np.take_along_axis(ancestor, ancestor, axis=-1)
+        if np.array_equal(next_ancestor, ancestor):
+            break
+        depth += np.take_along_axis(depth, ancestor, axis=-1)
+        ancestor = next_ancestor
+
+    return np.where(reached, depth, -1)
+
+
+def spread_curve(infection_round, n_rounds: int = None) -> np.ndarray:
+    """
+    Cumulative number of reached nodes at the end of each round, index 0 being the seeding round.
+    Batches are padded to the longest run, a finished run keeps its final coverage.
+    """
+    single = np.ndim(infection_round) == 1
+    infection_round = np.atleast_2d(np.asarray(infection_round, dtype=np.int64))
+    if n_rounds is None:
+        n_rounds = int(infection_round.max(initial=0)) + 1
+    runs = infection_round.shape[0]
+    # One bincount over (run, round) pairs, unreached nodes are dropped
+    run_index, node_round = np.nonzero(infection_round >= 0)[0], infection_round[infection_round >= 0]
+    counts = np.bincount(run_index * n_rounds + np.minimum(node_round, n_rounds - 1), minlength=runs * n_rounds)
+    curve = np.cumsum(counts.reshape(runs, n_rounds), axis=1)
+    return curve[0] if single else curve
+
+
+def branching_factor(parent) -> dict:
+    """
+    Offspring statistics of the infection forest.
+
+    Returns:
+    - dict: children (per-node number of nodes it infected), mean over reached nodes,
+      mean over nodes that infected at least one other node, and the maximum.
+    """
+    parent = np.asarray(parent, dtype=np.int64)
+    index = np.broadcast_to(np.arange(parent.shape[-1]), parent.shape)
+    edges = (parent >= 0) & (parent != index)
+    # Offset each run so a single bincount counts the children of every run of the batch
+    offset = (np.arange(parent.size) // parent.shape[-1]) * parent.shape[-1]
+    children = np.bincount((parent.ravel() + offset)[edges.ravel()], minlength=parent.size).reshape(parent.shape)
+    reached = np.count_nonzero(parent >= 0, axis=-1)
+    spreaders = np.count_nonzero(children > 0, axis=-1)
+    infections = np.count_nonzero(edges, axis=-1)
+    return {
+        'children': children,
+        'mean': infections / np.maximum(reached, 1),
+        'mean_spreaders': infections / np.maximum(spreaders, 1),
+        'max': children.max(axis=-1),
+    }
+
+
+def time_to_coverage(curve, n_nodes: int, fractions=DEFAULT_COVERAGE) -> dict:
+    """First round at which each fraction of the n_nodes has been reached, -1 if it never was."""
+    curve = np.asarray(curve)
+    result = {}
+    for fraction in fractions:
+        covered = curve >= np.ceil(fraction * n_nodes)
+        result[fraction] = np.where(covered.any(axis=-1), covered.argmax(axis=-1), -1)
+    return result
+
+
+def predict_remaining_rounds(curve, n_target: int, window: int = 5, max_rounds: int = 1000):
+    """
+    Estimates the rounds left before n_target nodes are reached, from a partial spread curve.
+
+    Push gossip follows a logistic curve, so logit(reached / n_target) is close to linear in the
+    round index. A line fitted over the last `window` rounds is extrapolated to the point where
+    less than half a node is missing.
+
+    Returns:
+    - int: Estimated rounds remaining, 0 once the target is reached, None while the curve is too
+      short or has not grown within the window, or when the estimate exceeds max_rounds.
+    """
+    curve = np.asarray(curve, dtype=np.float64)
+    if n_target <= 0 or (len(curve) and curve[-1] >= n_target):
+        return 0
+    rounds = np.arange(len(curve))[-window:]
+    coverage = curve[-window:] / n_target
+    observed = (coverage > 0) & (coverage < 1)
+    # A stalled spread has no trend to extrapolate, and its fit would only return float noise
+    if np.count_nonzero(observed) < 2 or coverage[-1] <= coverage[0]:
+        return None
+    logit = np.log(coverage[observed] / (1 - coverage[observed]))
+    slope, intercept = np.polyfit(rounds[observed], logit, 1)
+    if slope < MIN_LOGIT_SLOPE:
+        return None
+    # logit of (n_target - 1/2) / n_target
+    target_round = (np.log(2 * n_target - 1) - intercept) / slope
+    remaining = max(0, int(np.ceil(target_round - (len(curve) - 1))))
+    return remaining if remaining <= max_rounds else None
+
+
+def unreached_nodes(parent) -> np.ndarray:
+    """Ids of the nodes the rumor never reached in a single run."""
+    return np.flatnonzero(np.asarray(parent) < 0)
+
+
+def analyse_run(run: dict, fractions=DEFAULT_COVERAGE) -> dict:
+    """All infection tree metrics of a single run, as returned by load_run() or iter_runs()."""
+    parent, infection_round = run['parent'], run['infection_round']
+    depth = infection_depth(parent)
+    curve = spread_curve(infection_round)
+    branching = branching_factor(parent)
+    return {
+        'nodes': parent.size,
+        'reached': int(np.count_nonzero(parent >= 0)),
+        'max_depth': int(depth.max(initial=-1)),
+        'mean_depth': float(depth[depth >= 0].mean()) if np.any(depth >= 0) else 0.0,
+        'depth': depth,
+        'spread_curve': curve,
+        'branching_mean': float(branching['mean']),
+        'branching_mean_spreaders': float(branching['mean_spreaders']),
+        'branching_max': int(branching['max']),
+        'time_to_coverage': {fraction: int(rounds) for fraction, rounds in time_to_coverage(curve, parent.size, fractions).items()},
+        'unreached': unreached_nodes(parent),
+    }
+
+
+class RunSummary:
+    """
+    Streaming aggregate of many runs: memory grows with the node count and the number of
+    rounds, never with the number of runs.
+
+    Runs are buffered into batches of `batch_size` runs over the same node count and each
+    batch is analysed with a single set of vectorized operations.
+    """
+
+    def __init__(self, fractions=DEFAULT_COVERAGE, batch_size: int = 64):
+        self.fractions = tuple(fractions)
+        self.batch_size = batch_size
+        self.runs = 0
+        self.nodes = None
+        self._batch = []
+        self._curve_sum = np.zeros(0, dtype=np.float64)
+        self._curve_last_sum = 0.0
+        self._max_depth_sum = 0.0
+        self._mean_depth_sum = 0.0
+        self._depth_histogram = np.zeros(0, dtype=np.int64)
+        self._branching_sum = 0.0
+        self._branching_spreaders_sum = 0.0
+        self._reached_sum = 0
+        # Per fraction: [runs reaching it, sum of the rounds it took them]
+        self._coverage = {fraction: [0, 0] for fraction in self.fractions}
+        self._unreached_count = None
+
+    def add(self, run: dict):
+        parent = np.asarray(run['parent'], dtype=np.int64)
+        if self.nodes is None:
+            self.nodes = parent.size
+            self._unreached_count = np.zeros(self.nodes, dtype=np.int64)
+        elif parent.size != self.nodes:
+            raise ValueError(f"All runs of a summary must have the same node count ({self.nodes}), got {parent.size}")
+        self._batch.append((parent, np.asarray(run['infection_round'], dtype=np.int64)))
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def extend(self, runs):
+        for run in runs:
+            self.add(run)
+        return self
+
+    def _flush(self):
+        if not self._batch:
+            return
+        parent = np.stack([p for p, _ in self._batch])
+        infection_round = np.stack([r for _, r in self._batch])
+        self._batch = []
+        batch_runs = parent.shape[0]
+
+        depth = infection_depth(parent)
+        max_depth = depth.max(axis=1)
+        self._max_depth_sum += float(max_depth.sum())
+        reached_mask = depth >= 0
+        reached = reached_mask.sum(axis=1)
+        self._reached_sum += int(reached.sum())
+        self._mean_depth_sum += float((np.where(reached_mask, depth, 0).sum(axis=1) / np.maximum(reached, 1)).sum())
+        histogram = np.bincount(depth[reached_mask])
+        self._depth_histogram = _add_padded(self._depth_histogram, histogram)
+
+        curve = np.atleast_2d(spread_curve(infection_round))
+        # Earlier runs that finished sooner keep their final coverage in the longer rounds
+        if curve.shape[1] > self._curve_sum.size:
+            pad = curve.shape[1] - self._curve_sum.size
+            self._curve_sum = np.concatenate([self._curve_sum, np.full(pad, self._curve_last_sum)])
+        curve_sum = np.concatenate([curve, np.repeat(curve[:, -1:], self._curve_sum.size - curve.shape[1], axis=1)], axis=1).sum(axis=0)
+        self._curve_sum += curve_sum
+        self._curve_last_sum += float(curve[:, -1].sum())
+
+        branching = branching_factor(parent)
+        self._branching_sum += float(branching['mean'].sum())
+        self._branching_spreaders_sum += float(branching['mean_spreaders'].sum())
+        for fraction, rounds in time_to_coverage(curve, self.nodes, self.fractions).items():
+            hit = rounds[rounds >= 0]
+            self._coverage[fraction][0] += int(hit.size)
+            self._coverage[fraction][1] += int(hit.sum())
+        self._unreached_count += (parent < 0).sum(axis=0)
+        self.runs += batch_runs
+
+    def result(self) -> dict:
+        """Aggregated metrics over every run added so far."""
+        self._flush()
+        if self.runs == 0:
+            return {'runs': 0}
+        coverage = {}
+        for fraction, (hits, rounds) in self._coverage.items():
+            coverage[fraction] = {'runs_reaching': hits,
+                                  'mean_rounds': rounds / hits if hits else None}
+        return {
+            'runs': self.runs,
+            'nodes': self.nodes,
+            'mean_reached': self._reached_sum / self.runs,
+            'mean_max_depth': self._max_depth_sum / self.runs,
+            'mean_depth': self._mean_depth_sum / self.runs,
+            'depth_histogram': self._depth_histogram.tolist(),
+            'mean_spread_curve': (self._curve_sum / self.runs).tolist(),
+            'mean_branching': self._branching_sum / self.runs,
+            'mean_branching_spreaders': self._branching_spreaders_sum / self.runs,
+            'time_to_coverage': coverage,
+            'never_reached': np.flatnonzero(self._unreached_count == self.runs).tolist(),
+            'unreached_frequency': (self._unreached_count / self.runs).tolist(),
+        }
+
+
+def _add_padded(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Element-wise sum of two 1D arrays of possibly different lengths."""
+    if a.size < b.size:
+        a, b = b, a
+    a = a.copy()
+    a[:b.size] += b
+    return a
+
+
+def summarize_runs(runs, fractions=DEFAULT_COVERAGE, batch_size: int = 64) -> dict:
+    """Aggregates any iterable of runs (e.g. iter_runs(path)) without loading them all at once."""
+    return RunSummary(fractions, batch_size).extend(runs).result()
@@ -0,0 +1,114 @@
+from manim import *
+import numpy as np
+
+from utils.utils import STATE_NAMES
+
+# Same palette as the individual Node glyphs: SUSCEPTIBLE, INFECTED, REMOVED
+STATE_COLORS = [ORANGE, GREEN, GREY]
+
+
+class GridClusters():
+    """
+    Groups nodes into the cells of a regular grid laid over the layout. The grid is fixed when
+    built, so peers joining later fall into existing cells and the cluster count stays bounded.
+
+    Parameters:
+    - node_coordinates (dict): Layout keyed by node, as RandomGraph.node_coordinates.
+    - cells (tuple): (columns, rows) of the grid.
+    """
+
+    def __init__(self, node_coordinates: dict, cells=(16, 9)):
+        self.columns, self.rows = cells
+        xy = self._positions(node_coordinates, range(len(node_coordinates)))
+        self.lower = xy.min(axis=0)
+        # Small margin so the nodes on the upper bound fall in the last cell
+        self.size = (xy.max(axis=0) - self.lower) * (1 + 1e-6) + 1e-9
+        self.cluster_of = self.assign(xy)
+
+    @property
+    def n_clusters(self) -> int:
+        return self.columns * self.rows
+
+    @staticmethod
+    def _positions(node_coordinates, node_ids) -> np.ndarray:
+        return np.asarray([node_coordinates[node][:2] for node in node_ids], dtype=np.float64).reshape(-1, 2)
+
+    def assign(self, xy) -> np.ndarray:
+        """Cluster id of every (x, y) position, positions outside the grid go to the border cells."""
+        cell = np.floor((xy - self.lower) / self.size * (self.columns, self.rows)).astype(np.int64)
+        cell = np.clip(cell, 0, (self.columns - 1, self.rows - 1))
+        return cell[:, 1] * self.columns + cell[:, 0]
+
+    def extend(self, node_coordinates: dict):
+        """Assigns the peers that joined since the last call."""
+        new_ids = range(len(self.cluster_of), len(node_coordinates))
+        if len(new_ids):
+            self.cluster_of = np.concatenate((self.cluster_of, self.assign(self._positions(node_coordinates, new_ids))))
+        return self.cluster_of
+
+    def center(self, cluster: int) -> np.ndarray:
+        column, row = cluster % self.columns, cluster // self.columns
+        x, y = self.lower + self.size * ((column + 0.5) / self.columns, (row + 0.5) / self.rows)
+        return np.array([x, y, 0.0])
+
+    def state_counts(self, node_state, visible) -> np.ndarray:
+        """Number of visible nodes of each state per cluster, shape (n_clusters, n_states)."""
+        n_states = len(STATE_NAMES)
+        keys = self.cluster_of[visible] * n_states + node_state[visible]
+        return np.bincount(keys, minlength=self.n_clusters * n_states).reshape(self.n_clusters, n_states)
+
+
+class ClusterGlyph(VGroup):
+    """
+    A whole cluster drawn as one pie: slice angles are the state proportions of its nodes
+    and the radius grows with the square root of its size.
+    """
+
+    def __init__(self, center: np.ndarray, counts: np.ndarray, max_count: int, max_radius: float = 0.3, **kwargs):
+        super().__init__(**kwargs)
+        self.cluster_center = center
+        self.max_count = max(int(max_count), 1)
+        self.max_radius = max_radius
+        self.add(*self._sectors(counts))
+
+    def _sectors(self, counts) -> list:
+        """One sector per state, always all three so Transform maps slices one to one."""
+        total = int(np.sum(counts))
+        radius = self.max_radius * max(np.sqrt(total / self.max_count), 0.2)
+        sectors = []
+        start_angle = PI / 2
+        for count, color in zip(np.asarray(counts).tolist(), STATE_COLORS):
+            angle = TAU * count / total if total else 0
+            sector = AnnularSector(inner_radius=0, outer_radius=radius, angle=max(angle, 1e-3), start_angle=start_angle,
+                                   fill_color=color, fill_opacity=0.75 if angle else 0, stroke_width=0)
+            sector.shift(self.cluster_center)
+            sectors.append(sector)
+            start_angle += angle
+        return sectors
+
+    def update_counts(self, counts) -> Animation:
+        """Animation morphing the slices to the new state proportions."""
+        return Transform(self, VGroup(*self._sectors(counts)))
+
+
+def transmission_bundles(sources, targets, centers: dict, max_bundles: int = 64) -> list:
+    """
+    Flashes one line per pair of clusters that exchanged messages in the round, its width
+    growing with the log of the number of messages. Only the `max_bundles` heaviest pairs are
+    drawn, and the flash leaves nothing behind in the scene.
+
+    Parameters:
+    - sources, targets (array): Cluster id of the sender and of the receiver of every transmission.
+    - centers (dict): Position of each cluster glyph.
+    """
+    sources, targets = np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64)
+    crossing = sources != targets
+    if not np.any(crossing):
+        return []
+    pairs, counts = np.unique(np.column_stack((sources[crossing], targets[crossing])), axis=0, return_counts=True)
+    heaviest = np.argsort(counts)[::-1][:max_bundles]
+    animations = []
+    for (source, target), count in zip(pairs[heaviest].tolist(), counts[heaviest].tolist()):
+        line = Line(centers[source], centers[target], stroke_color=BLUE, stroke_width=float(1 + 2 * np.log2(count)))
+        animations.append(ShowPassingFlash(line, time_width=0.6, run_time=0.8))
+    return animations
@@ -11,19 +11,10 @@ from manim.utils.utils import slides_text
 from graph.graph import RandomGraph
 import logging
 from anim.proyectile import Projectile
+from anim.cluster import GridClusters, ClusterGlyph, transmission_bundles
+from utils.utils import changed_nodes, STATE_DTYPE, SUSCEPTIBLE, INFECTED, REMOVED
 
-def is_subset(list_to_check, predefined_values):
-    return set(list_to_check).issubset(set(predefined_values))
 
-
-def diff_arrays(list1, list2):
-    if len(list1) != len(list2):
-        raise ValueError("Both lists must be of the same length")
-
-    return [1 if list1[i] != list2[i] else 0 for i in range(len(list1))]
-
-
-NODE_STATUS = {1: 'SUSCEPTIBLE', 2: 'INFECTED', 3: 'REMOVED'}
 class Node(Circle):
     def __init__(self,
         radius: float = 0.06,
@@ -42,37 +33,135 @@ class Node(Circle):
         self.label.next_to(self, UP, buff=0.5)
 
 
+class EdgeBatch(VMobject):
+    """
+    Any number of straight edges held by a single VMobject: every edge is one cubic Bezier
+    curve of the point array, and the renderer splits the disconnected curves into subpaths.
+    Changing the edges rewrites the point array in place, the mobject itself is never replaced.
+    """
+
+    def __init__(self,
+        stroke_color: Color = WHITE,
+        stroke_width: float = 0.5,
+        stroke_opacity: float = 0.15,
+        **kwargs) -> None:
+
+        super().__init__(stroke_color=stroke_color, stroke_width=stroke_width, stroke_opacity=stroke_opacity,
+                         fill_opacity=0, **kwargs)
+
+    def set_segments(self, starts: np.ndarray, ends: np.ndarray):
+        """Replaces the edges by the segments starts[k] -> ends[k], both of shape (n, 3)."""
+        starts, ends = np.asarray(starts, dtype=float).reshape(-1, 3), np.asarray(ends, dtype=float).reshape(-1, 3)
+        # Straight cubic Bezier: anchors at both ends, handles at a third and two thirds
+        delta = ends - starts
+        points = np.stack((starts, starts + delta / 3, starts + 2 * delta / 3, ends), axis=1).reshape(-1, 3)
+        self.set_points(points)
+        return self
+
+
 class Graph2D(Scene):
 
     def __init__(self,
         n_nodes: int, 
         n_edges: int, 
         state_file: dict = {},
-        is_directed: bool = False
+        is_directed: bool = False,
+        adjacency_list: list = None,
+        node_coordinates: dict = None,
+        lod_cells: tuple = None,
+        seed: int = None,
+        layout_seed: int = None,
+        show_edges: bool = True
         ):
         
         super().__init__()
 
         self._n_nodes = n_nodes
         self._n_edges = n_edges
-        self.random_graph = RandomGraph(n_nodes, n_edges, is_directed)
+        self.random_graph = RandomGraph(n_nodes, n_edges, is_directed, adjacency_list=adjacency_list, node_coordinates=node_coordinates, seed=seed, layout_seed=layout_seed)
         self.adjacency_list = self.random_graph.adjacency_list
         self.logger = logging.getLogger(__name__)
         self.state_file = state_file
+        # Membership and infection parents of the peers, shared with the middleware once the simulation updates the scene
+        self.online: np.ndarray = None
+        self.parents: np.ndarray = None
 
         if len(self.random_graph.get_nodes) > 0:
-            self.node_status: list[str] = [NODE_STATUS[1] for _ in range(len(self.random_graph.get_nodes))]
-            self.node_coordinates: dict = self.random_graph.random_layout(dim=3)
-            self.node_ids : list[int] = [key for key in self.node_coordinates.keys()]
+            self.node_status: np.ndarray = np.full(len(self.random_graph.get_nodes), SUSCEPTIBLE, dtype=STATE_DTYPE)
+            self.node_coordinates: dict = self.random_graph.node_coordinates
+            self.node_ids : list[int] = self.random_graph.node_ids
         else:
             raise ValueError('Number of nodes in graph must be at least 1. Please provide a different value for n_nodes')        
         self.queue = []
         self.nodes_2s: list[VMobject] = []
+        # Level of detail: with (columns, rows) set, nodes are drawn as one glyph per grid cell and
+        # transmissions as bundles between cells, so the scene size does not grow with the node count
+        self.lod_cells = lod_cells
+        self.clusters: GridClusters = None
+        self.cluster_glyphs: dict = {}
+        # All edges in one mobject, and the edges used by the last round in a second one on top
+        self.show_edges = show_edges and lod_cells is None
+        self.edges_2s = EdgeBatch()
+        self.active_edges_2s = EdgeBatch(stroke_color=BLUE, stroke_width=2, stroke_opacity=0)
+        # Topology version drawn by edges_2s, and layout as an array indexed by node id
+        self._edges_version = None
+        self._layout: np.ndarray = None
         
         self.is_new_graph = True
         self.is_first = True
     
+    def _visible_nodes(self) -> np.ndarray:
+        """Mask of the online peers, every node before the first update from the middleware."""
+        if self.online is None:
+            return np.ones(len(self.node_status), dtype=bool)
+        return self.online
+
+    def draw_cluster_map(self):
+        """Initial map of the level of detail mode: one pie glyph per non-empty grid cell."""
+        self.clusters = GridClusters(self.node_coordinates, self.lod_cells)
+        counts = self.clusters.state_counts(self.node_status, self._visible_nodes())
+        max_count = counts.sum(axis=1).max(initial=1)
+        for cluster in np.flatnonzero(counts.sum(axis=1)).tolist():
+            self.cluster_glyphs[cluster] = ClusterGlyph(self.clusters.center(cluster), counts[cluster], max_count)
+        self.play(AnimationGroup(*[GrowFromCenter(glyph) for glyph in self.cluster_glyphs.values()]))
+        self.wait(1)
+
+    def _positions(self, node_ids) -> np.ndarray:
+        # Positions never move, the array only grows when peers join
+        if self._layout is None or len(self._layout) != len(self.node_coordinates):
+            self._layout = np.asarray([self.node_coordinates[node] for node in range(len(self.node_coordinates))],
+                                      dtype=float).reshape(-1, 3)
+        return self._layout[np.asarray(node_ids, dtype=np.int64)]
+
+    def _update_edges(self):
+        """Rewrites the edge batch from the cached adjacency, only when churn changed it since the
+        last call. A static overlay is built once."""
+        if self._edges_version == self.random_graph.topology_version:
+            return
+        self._edges_version = self.random_graph.topology_version
+        sources = np.fromiter((source for source, targets in enumerate(self.adjacency_list) for _ in targets), dtype=np.int64)
+        targets = np.fromiter((target for targets in self.adjacency_list for target in targets), dtype=np.int64, count=len(sources))
+        if not self.random_graph.is_directed:
+            # Undirected edges are listed from both ends
+            sources, targets = sources[sources < targets], targets[sources < targets]
+        self.edges_2s.set_segments(self._positions(sources), self._positions(targets))
+
+    def _highlight_edges(self, sources, targets) -> Animation:
+        """Points the highlight batch at this round's transmissions and fades it in, a single
+        animation whatever the number of edges."""
+        self.active_edges_2s.set_segments(self._positions(sources), self._positions(targets))
+        self.active_edges_2s.set_stroke(opacity=0)
+        return self.active_edges_2s.animate.set_stroke(opacity=0.9)
+
     def draw_initial_map(self):
+        if self.lod_cells is not None:
+            return self.draw_cluster_map()
+        if self.show_edges:
+            self._update_edges()
+            # Behind the nodes
+            self.edges_2s.set_z_index(-2)
+            self.active_edges_2s.set_z_index(-1)
+            self.add(self.edges_2s, self.active_edges_2s)
         # Create as many nodes objects as nodes are in random_graph
         for node_id in self.node_ids:
             node = Node(label=str(node_id))
@@ -84,39 +173,103 @@ class Graph2D(Scene):
         print(self.node_coordinates[0][0], self.nodes_2s[0])
         animations = [self.nodes_2s[node].animate.move_to(self.node_coordinates[node]) for node in self.node_ids]
        
+        if self.show_edges:
+            animations.append(FadeIn(self.edges_2s))
         self.play(AnimationGroup(*animations))
         self.wait(1)
             
+    def _update_membership(self, cache_online):
+        """Fades in peers that joined and fades out peers that left since the last frame (churn).
+        Mobjects of joined peers are created on the fly, directly at their layout position.
+        Returns the animations and the membership mask to cache for the next frame."""
+        for node_id in self.node_ids[len(self.nodes_2s):]:
+            node = Node(label=str(node_id))
+            node.move_to(self.node_coordinates[node_id])
+            self.nodes_2s.append(node)
+        online = self._visible_nodes()
+        # Newly created peers were not on screen yet
+        cache_online = np.concatenate((cache_online, np.zeros(len(online) - len(cache_online), dtype=bool)))
+
+        membership_animation = [FadeIn(self.nodes_2s[i]) for i in np.flatnonzero(online & ~cache_online).tolist()]
+        membership_animation += [FadeOut(self.nodes_2s[i]) for i in np.flatnonzero(~online & cache_online).tolist()]
+        return membership_animation, online.copy()
+
+    def _update_clusters(self):
+        cache_nodes = np.full(len(self.node_status), SUSCEPTIBLE, dtype=STATE_DTYPE)
+        # Draw the clustered map
+        def redraw_clusters():
+            nonlocal cache_nodes
+            self.logger.info(f"Start updating clusters. Chill...")
+            cluster_of = self.clusters.extend(self.node_coordinates)
+            counts = self.clusters.state_counts(self.node_status, self._visible_nodes())
+            max_count = counts.sum(axis=1).max(initial=1)
+            animations = []
+            for cluster in np.flatnonzero(counts.sum(axis=1)).tolist():
+                if cluster not in self.cluster_glyphs:
+                    # A cell populated by joining peers
+                    self.cluster_glyphs[cluster] = ClusterGlyph(self.clusters.center(cluster), counts[cluster], max_count)
+                    animations.append(FadeIn(self.cluster_glyphs[cluster]))
+            for cluster, glyph in self.cluster_glyphs.items():
+                animations.append(glyph.update_counts(counts[cluster]))
+            # Parent -> child cluster of every node infected since the last frame
+            infected = changed_nodes(self.node_status, cache_nodes)
+            infected = infected[self.node_status[infected] == INFECTED]
+            parents = self.parents[infected]
+            keep = parents >= 0
+            centers = {cluster: self.clusters.center(cluster) for cluster in range(self.clusters.n_clusters)}
+            bundles = transmission_bundles(cluster_of[parents[keep]], cluster_of[infected[keep]], centers)
+            self.play(AnimationGroup(*animations, *bundles))
+            cache_nodes = self.node_status.copy()
+            self.logger.info(f"Finish updating clusters!")
+        return redraw_clusters
+
     def _update_graph(self):
-        cache_nodes = ['SUSCEPTIBLE' for _ in range(len(self.random_graph.get_nodes))]
+        if self.lod_cells is not None:
+            return self._update_clusters()
+        cache_nodes = np.full(len(self.random_graph.get_nodes), SUSCEPTIBLE, dtype=STATE_DTYPE)
+        cache_online = np.ones(len(self.nodes_2s), dtype=bool)
         # Draw a map
         def redraw_map():
-            nonlocal cache_nodes
+            nonlocal cache_nodes, cache_online
             self.logger.info(f"Start updating nodes. Chill...")
-            node_animation = []
+            node_animation, cache_online = self._update_membership(cache_online)
             proyectiles = []
-            diff_nodes = diff_arrays(self.node_status, cache_nodes) # Mask function -> Compares two lists of str and returns a binary list
-            for i, mask in zip(self.node_ids, diff_nodes):
-                if mask == 1:
-                    if cache_nodes[i] == NODE_STATUS[1]:
-                        node_animation.append(self.nodes_2s[i].animate.set_style(fill_color=GREEN, fill_opacity=0.65, stroke_color ="#013220" , stroke_opacity=1))
-                        # Read the source node id from which the newly update node received the message from the state file
-                        node_id_start = int(self.state_file['gossipers'][str(self.node_ids[i])]['parent_node'])
-                        print(node_id_start, self.node_ids[i])
-                        proyectile = Projectile(self.node_coordinates[node_id_start], self.node_coordinates[self.node_ids[i]])
-                        self.add(proyectile.add_traces())
-                        proyectiles.append(proyectile.construct())
-                    else: 
-                        node_animation.append(self.nodes_2s[i].animate.set_style(fill_color=GREY, fill_opacity=0.65, stroke_color = "#343d46", stroke_opacity = 1))
+            edge_sources, edge_targets = [], []
+            # Vectorized comparison of the state codes, peers joined since the last frame count as SUSCEPTIBLE
+            diff_nodes = changed_nodes(self.node_status, cache_nodes)
+            for i in diff_nodes.tolist():
+                if i >= len(cache_nodes) or cache_nodes[i] == SUSCEPTIBLE:
+                    node_animation.append(self.nodes_2s[i].animate.set_style(fill_color=GREEN, fill_opacity=0.65, stroke_color ="#013220" , stroke_opacity=1))
+                    # Read the source node id from which the newly update node received the message from the state file
+                    node_id_start = int(self.parents[self.node_ids[i]])
+                    print(node_id_start, self.node_ids[i])
+                    edge_sources.append(node_id_start)
+                    edge_targets.append(self.node_ids[i])
+                    proyectile = Projectile(self.node_coordinates[node_id_start], self.node_coordinates[self.node_ids[i]])
+                    self.add(proyectile.add_traces())
+                    proyectiles.append(proyectile.construct())
+                else: 
+                    node_animation.append(self.nodes_2s[i].animate.set_style(fill_color=GREY, fill_opacity=0.65, stroke_color = "#343d46", stroke_opacity = 1))
+            if self.show_edges:
+                self._update_edges()
+                if edge_sources:
+                    node_animation.append(self._highlight_edges(edge_sources, edge_targets))
+                else:
+                    self.active_edges_2s.set_stroke(opacity=0)
             self.play(AnimationGroup(*node_animation, *proyectiles))
             cache_nodes = self.node_status.copy()
             self.logger.info(f"Finish updating nodes!")   
         return redraw_map
 
-    def update_node_status(self, update_node_status: list = [], update_state_file: dict = {}):        
-        if is_subset(update_node_status, ['SUSCEPTIBLE', 'INFECTED', 'REMOVED']) and len(update_node_status) == len(self.node_status):
+    def update_node_status(self, update_node_status: np.ndarray, middleware=None):        
+        # The array grows when peers join the overlay, it never shrinks since leaving peers keep their id
+        update_node_status = np.asarray(update_node_status, dtype=STATE_DTYPE)
+        if update_node_status.max(initial=SUSCEPTIBLE) <= REMOVED and len(update_node_status) >= len(self.node_status):
             self.node_status = update_node_status
-            self.state_file = update_state_file
+            if middleware is not None:
+                self.online = middleware.online
+                self.parents = middleware.parent
+            self.node_ids = self.random_graph.node_ids
         else:
             raise ValueError('Updated node status list lenght does not match current node status lenght')
 
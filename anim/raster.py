@@ -0,0 +1,246 @@
+import os
+import sys
+import logging
+import struct
+import subprocess
+import zlib
+import numpy as np
+
+current_script_path = os.path.dirname(os.path.abspath(__file__))
+root_directory = os.path.abspath(os.path.join(current_script_path, ".."))  # Go up one level
+sys.path.append(root_directory)
+
+from utils.utils import changed_nodes, STATE_DTYPE, SUSCEPTIBLE, INFECTED
+
+# Pure NumPy renderer for graphs too large for Manim: no manim import, frames are rasterized
+# straight into uint8 buffers and streamed to a writer one at a time.
+
+# Same palette as Graph2D (Manim ORANGE, GREEN, GREY) on the custom_config background
+STATE_COLORS = np.array([[255, 134, 47],    # SUSCEPTIBLE
+                         [131, 193, 103],   # INFECTED
+                         [136, 136, 136]],  # REMOVED
+                        dtype=np.float32)
+BACKGROUND_COLOR = np.array([15, 15, 15], dtype=np.float32)
+EDGE_COLOR = np.array([255, 255, 255], dtype=np.float32)
+
+# Manim's default frame (14.22 x 8 units) around the RandomGraph.random_layout box
+DEFAULT_BOUNDS = ((-64 / 9, 64 / 9), (-4.0, 4.0))
+
+
+def _box_blur(image, radius):
+    """Separable box filter over the two first axes using cumulative sums, O(pixels) for any radius."""
+    if radius <= 0:
+        return image
+    for axis in (0, 1):
+        padded = np.pad(image, [(radius + 1, radius) if a == axis else (0, 0) for a in range(image.ndim)])
+        cumulative = np.cumsum(padded, axis=axis)
+        size = image.shape[axis]
+        image = np.take(cumulative, np.arange(2 * radius + 1, 2 * radius + 1 + size), axis=axis) - \
+            np.take(cumulative, np.arange(size), axis=axis)
+    return image
+
+
+class RasterRenderer:
+    """
+    Rasterizes gossip rounds into RGB NumPy frames: node density splatting coloured by state,
+    plus an optional overlay of the edges used by the infections of the round.
+
+    Can be driven directly with render_frame(), or used as the view of a Simulation since it
+    exposes the same update_node_status()/construct() pair as Graph2D.
+
+    Parameters:
+    - node_coordinates (dict or array): Layout keyed by node (RandomGraph.random_layout) or an (N, >=2) array.
+    - writer: Object with write(frame) and close(), e.g. FFmpegWriter or PngSequenceWriter.
+    - width, height (int): Frame size in pixels.
+    - bounds (tuple): ((xmin, xmax), (ymin, ymax)) of the layout area mapped to the frame.
+    - splat_radius (int): Half size in pixels of the square each node is splatted onto.
+    - show_edges (bool): Overlay parent -> child segments of the nodes infected in the round.
+    - edge_opacity (float): Opacity of a single segment, overlapping segments compound.
+    - frames_per_round (int): Frames written per round, to give each round some screen time.
+    """
+
+    def __init__(self, node_coordinates, writer=None, width: int = 1920, height: int = 1080, bounds=DEFAULT_BOUNDS,
+                 splat_radius: int = 1, show_edges: bool = True, edge_opacity: float = 0.25, frames_per_round: int = 1):
+        self.logger = logging.getLogger(__name__)
+        self.writer = writer
+        self.width = width
+        self.height = height
+        self.bounds = bounds
+        self.splat_radius = splat_radius
+        self.show_edges = show_edges
+        self.edge_opacity = edge_opacity
+        self.frames_per_round = frames_per_round
+        self.node_coordinates = node_coordinates
+        self._pixels = None
+        self._cache_status = np.zeros(0, dtype=STATE_DTYPE)
+        # The first frame, drawn before any update, shows the whole overlay SUSCEPTIBLE
+        self.node_status = np.full(len(node_coordinates), SUSCEPTIBLE, dtype=STATE_DTYPE)
+        self.middleware = None
+
+    def _pixel_positions(self) -> np.ndarray:
+        """Flat pixel index of every node, recomputed only when nodes joined the layout."""
+        coordinates = self.node_coordinates
+        n_nodes = len(coordinates)
+        if self._pixels is None or len(self._pixels) != n_nodes:
+            if isinstance(coordinates, dict):
+                coordinates = np.asarray([coordinates[node] for node in sorted(coordinates)], dtype=np.float32)
+            coordinates = np.asarray(coordinates, dtype=np.float32)
+            self._xy = self._to_pixels(coordinates[:, 0], coordinates[:, 1])
+            self._pixels = self._xy[:, 1] * self.width + self._xy[:, 0]
+        return self._pixels
+
+    def _to_pixels(self, x, y) -> np.ndarray:
+        (xmin, xmax), (ymin, ymax) = self.bounds
+        px = np.clip(((x - xmin) / (xmax - xmin) * self.width).astype(np.int64), 0, self.width - 1)
+        py = np.clip(((ymax - y) / (ymax - ymin) * self.height).astype(np.int64), 0, self.height - 1)
+        return np.column_stack((px, py))
+
+    def _splat_nodes(self, node_state, visible) -> np.ndarray:
+        """Per-pixel node counts of each state, shape (height, width, 3)."""
+        pixels = self._pixel_positions()[:len(node_state)]
+        n_pixels = self.width * self.height
+        # One bincount over (state, pixel) pairs instead of one pass per state
+        keys = node_state[visible].astype(np.int64) * n_pixels + pixels[visible]
+        counts = np.bincount(keys, minlength=len(STATE_COLORS) * n_pixels).astype(np.float32)
+        counts = counts.reshape(len(STATE_COLORS), self.height, self.width).transpose(1, 2, 0)
+        return _box_blur(counts, self.splat_radius)
+
+    def _edge_overlay(self, sources, targets, max_samples: int = 1 << 22) -> np.ndarray:
+        """Number of infection segments crossing each pixel, rasterized by sampling every segment
+        once per pixel of its length. Segments are processed in chunks bounding the memory used."""
+        overlay = np.zeros(self.width * self.height, dtype=np.float32)
+        if len(sources) == 0:
+            return overlay.reshape(self.height, self.width)
+        start, end = self._xy[sources].astype(np.float32), self._xy[targets].astype(np.float32)
+        # One sample per pixel along the dominant axis of each segment
+        lengths = np.abs(end - start).max(axis=1).astype(np.int64) + 1
+        order = np.argsort(lengths)
+        sorted_lengths = lengths[order]
+        begin = 0
+        while begin < len(order):
+            # Sorted by length, so the last segment of a chunk is its longest one
+            stop = min(len(order), begin + max(1, max_samples // int(sorted_lengths[begin])))
+            while stop - begin > 1 and (stop - begin) * int(sorted_lengths[stop - 1]) > max_samples:
+                stop = begin + (stop - begin) // 2
+            chunk = order[begin:stop]
+            t = np.linspace(0.0, 1.0, int(sorted_lengths[stop - 1]), dtype=np.float32)
+            points = np.rint(start[chunk, None, :] + (end[chunk] - start[chunk])[:, None, :] * t[None, :, None]).astype(np.int64)
+            overlay += np.bincount((points[..., 1] * self.width + points[..., 0]).ravel(), minlength=overlay.size).astype(np.float32)
+            begin = stop
+        return overlay.reshape(self.height, self.width)
+
+    def render_frame(self, node_state, parents=None, visible=None) -> np.ndarray:
+        """
+        Rasterizes one round.
+
+        Parameters:
+        - node_state (array): uint8 state codes indexed by node id.
+        - parents (tuple): (sources, targets) arrays of the infection edges to highlight.
+        - visible (array): Boolean mask of the nodes to draw, e.g. the online peers under churn.
+
+        Returns:
+        - np.ndarray: (height, width, 3) uint8 RGB frame.
+        """
+        node_state = np.asarray(node_state, dtype=STATE_DTYPE)
+        if visible is None:
+            visible = np.ones(len(node_state), dtype=bool)
+        counts = self._splat_nodes(node_state, visible)
+        total = counts.sum(axis=2)
+        # Colour is the state mix of the pixel, opacity grows with the log of its node density
+        color = counts @ STATE_COLORS / np.maximum(total, 1e-6)[..., None]
+        alpha = np.log1p(total) / np.log1p(max(float(total.max()), 1.0))
+        frame = BACKGROUND_COLOR * (1 - alpha[..., None]) + color * alpha[..., None]
+
+        if self.show_edges and parents is not None:
+            edge_alpha = (1 - (1 - self.edge_opacity) ** self._edge_overlay(*parents))[..., None]
+            frame = frame * (1 - edge_alpha) + EDGE_COLOR * edge_alpha
+        return np.clip(frame, 0, 255).astype(np.uint8)
+
+    def write_frame(self, frame):
+        if self.writer is not None:
+            for _ in range(self.frames_per_round):
+                self.writer.write(frame)
+
+    # Simulation view interface, mirrors Graph2D
+    def update_node_status(self, update_node_status, middleware=None):
+        self.node_status = np.asarray(update_node_status, dtype=STATE_DTYPE)
+        self.middleware = middleware
+
+    def construct(self):
+        """Renders the current round and streams it to the writer, nothing is kept in memory."""
+        node_status = self.node_status
+        parents = None
+        visible = None
+        if self.middleware is not None:
+            visible = self.middleware.online
+        if self.show_edges and visible is not None:
+            infected = changed_nodes(node_status, self._cache_status)
+            infected = infected[node_status[infected] == INFECTED]
+            sources = self.middleware.parent[infected]
+            keep = (sources >= 0) & (sources != infected)
+            parents = (sources[keep], infected[keep])
+        self.write_frame(self.render_frame(node_status, parents, visible))
+        self._cache_status = node_status.copy()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def states_from_trace(infection_round, n_rounds: int = None):
+    """Per-round state vectors of a recorded run (see analytics), INFECTED from its infection round on."""
+    infection_round = np.asarray(infection_round)
+    if n_rounds is None:
+        n_rounds = int(infection_round.max(initial=0)) + 1
+    for round_index in range(n_rounds):
+        yield np.where((infection_round >= 0) & (infection_round <= round_index), INFECTED, SUSCEPTIBLE).astype(STATE_DTYPE)
+
+
+class FFmpegWriter:
+    """Pipes raw RGB frames to an ffmpeg subprocess that encodes them on the fly."""
+
+    def __init__(self, filepath: str, width: int, height: int, fps: int = 30, ffmpeg: str = 'ffmpeg'):
+        command = [ffmpeg, '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+                   '-pix_fmt', 'yuv420p', filepath]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame: np.ndarray):
+        self.process.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self.process.returncode}")
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def encode_png(frame: np.ndarray, compression: int = 6) -> bytes:
+    """Encodes an RGB uint8 frame as PNG with the standard library only."""
+    height, width, _ = frame.shape
+    # Filter type 0 (None) prefix on every scanline
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), frame.reshape(height, width * 3)], axis=1)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header) +
+            _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), compression)) + _png_chunk(b'IEND', b''))
+
+
+class PngSequenceWriter:
+    """Writes every frame as a numbered PNG file, e.g. to be assembled by ffmpeg later."""
+
+    def __init__(self, directory: str, prefix: str = 'frame'):
+        self.directory = directory
+        self.prefix = prefix
+        self.count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame: np.ndarray):
+        with open(os.path.join(self.directory, f'{self.prefix}_{self.count:06d}.png'), 'wb') as f:
+            f.write(encode_png(frame))
+        self.count += 1
+
+    def close(self):
+        pass
@@ -0,0 +1,105 @@
+"""Memory benchmark: bytes per node held by the middleware and added by one gossip round.
+
+Middleware: a P2PService after a share of the nodes has been infected, i.e. the per node
+arrays, the SUSCEPTIBLE neighbor lists and the in-memory state file sections. The graph itself
+is built beforehand and not counted.
+Round: peak allocation while the ThreadManager runs every INFECTED node once, including the
+GossiperViews of the worker threads and the messages queued for the middleware.
+Per-gossiper objects, for comparison: the state file entry, Gossiper and Thread that used to be
+built for every infected node of a round.
+Run from the repository root:
+
+    python benchmarks/bench_memory.py --nodes 1000000
+"""
+import argparse
+import contextlib
+import os
+import queue
+import sys
+import threading
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(ROOT)
+
+from graph.graph import RandomGraph
+from gossip.gossiper import Gossiper
+from middleware.p2p_service import P2PService
+from threads.thread_manager import ThreadManager
+from utils.utils import RandomStreams, INFECTED
+
+
+def _measure(build):
+    """Bytes still allocated once build() returned, and the peak reached while it ran.
+    The result of build() is returned along, so it stays alive until the caller drops it."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated - before, peak - before, kept
+
+
+def build_middleware(graph, n_infected, streams, fanout, repetitions):
+    middleware = P2PService(graph, None, queue.Queue(), fanout, repetitions, streams=streams)
+    infected = streams.generator(RandomStreams.SEED_NODE).choice(len(graph.node_ids), size=n_infected, replace=False)
+    for node_id in infected.tolist():
+        middleware.update_state_file(node_id, node_id, 'Pim!!!')
+    return middleware
+
+
+def run_round(middleware, workers):
+    # The gossipers print their fanout, keep it out of the measure and of the terminal
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        ThreadManager(middleware, middleware.message_queue, cycle_delay=0, workers=workers).start_event_loop()
+    return middleware.message_queue.qsize()
+
+
+def per_gossiper_objects(middleware):
+    node_ids = np.flatnonzero(middleware.node_state == INFECTED).tolist()
+    entries = middleware.gossiper_entries(node_ids)
+    gossipers = [Gossiper(node_id=node_id, state=INFECTED, message='Pim!!!', fanout=middleware.fanout,
+                          repetitions=middleware.repetitions, state_filepath=None, msg_queue=middleware.message_queue,
+                          middleware=middleware)
+                 for node_id in node_ids]
+    threads = [threading.Thread(target=gossiper.run) for gossiper in gossipers]
+    return entries, gossipers, threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory used per node by the middleware and a gossip round.")
+    parser.add_argument("--nodes", default=100000, type=int, help="Number of nodes in the graph.")
+    parser.add_argument("--edges", default=None, type=int, help="Number of edges, 1.5 per node when omitted.")
+    parser.add_argument("--infected", default=0.5, type=float, help="Share of the nodes INFECTED when the round runs.")
+    parser.add_argument("--fanout", default=3, type=int, help="Number of forwarding nodes per gossiper.")
+    parser.add_argument("--repetitions", default=2, type=int, help="Number of rounds a node gossips.")
+    parser.add_argument("--workers", default=8, type=int, help="Worker threads of the thread manager.")
+    parser.add_argument("--seed", default=1, type=int, help="Master seed of the random streams.")
+    args = parser.parse_args()
+
+    streams = RandomStreams(args.seed)
+    n_edges = args.edges if args.edges is not None else 3 * args.nodes // 2
+    graph = RandomGraph(args.nodes, n_edges, seed=streams.seed_for(RandomStreams.TOPOLOGY),
+                        layout_seed=streams.seed_for(RandomStreams.LAYOUT))
+    # Build the lazy graph attributes up front, they belong to the graph and not to the middleware
+    graph.in_adjacency_list, graph.node_coordinates
+    n_infected = int(args.nodes * args.infected)
+
+    middleware_bytes, _, middleware = _measure(
+        lambda: build_middleware(graph, n_infected, streams, args.fanout, args.repetitions))
+    legacy_bytes, _, legacy = _measure(lambda: per_gossiper_objects(middleware))
+    del legacy
+    _, round_peak, messages = _measure(lambda: run_round(middleware, args.workers))
+
+    print(f"{args.nodes} nodes, {n_infected} INFECTED, {messages} messages queued by the round")
+    print(f"{'measure':<48} {'total (MB)':>11} {'bytes/node':>11}")
+    for name, total in (("P2PService state", middleware_bytes),
+                        ("round peak (ThreadManager, views, queue)", round_peak),
+                        ("per-gossiper entry + Gossiper + Thread", legacy_bytes)):
+        print(f"{name:<48} {total / 1e6:>11.1f} {total / args.nodes:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Startup benchmark: import cost of the simulation core and of each CLI entry point.
+
+Every measurement runs in a fresh interpreter, which is what each sweep worker pays.
+Run from the repository root:
+
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Modules the headless core must never pull in
+HEAVY_MODULES = ['manim', 'matplotlib', 'pandas']
+
+CORE_MODULES = ['graph.graph', 'middleware.p2p_service', 'gossip.gossiper', 'threads.thread_manager',
+                'simulation.simulation', 'analytics.analytics', 'churn.churn', 'anim.raster',
+                'rumors.rumors']
+
+COMMANDS = {
+    'main.py simulate --help': [sys.executable, 'main.py', 'simulate', '--help'],
+    'main.py sweep --help': [sys.executable, 'main.py', 'sweep', '--help'],
+}
+
+
+def _time_command(command, repeat):
+    """Best wall time in seconds over `repeat` fresh interpreters."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _heavy_imports(module):
+    """Heavy modules that end up in sys.modules after importing `module`."""
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure interpreter startup and import cost.")
+    parser.add_argument("--repeat", default=5, type=int, help="Fresh interpreters per measurement.")
+    args = parser.parse_args()
+
+    baseline = _time_command([sys.executable, '-c', 'pass'], args.repeat)
+    print(f"{'target':<32} {'best (ms)':>10} {'over python (ms)':>17}  heavy imports")
+    print(f"{'python -c pass':<32} {baseline * 1e3:>10.1f} {0:>17.1f}")
+    for module in CORE_MODULES:
+        elapsed = _time_command([sys.executable, '-c', f'import {module}'], args.repeat)
+        heavy = _heavy_imports(module) or '-'
+        print(f"{'import ' + module:<32} {elapsed * 1e3:>10.1f} {(elapsed - baseline) * 1e3:>17.1f}  {heavy}")
+    for name, command in COMMANDS.items():
+        elapsed = _time_command(command, args.repeat)
+        print(f"{name:<32} {elapsed * 1e3:>10.1f} {(elapsed - baseline) * 1e3:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+import json
+import logging
+
+from utils.utils import ndarray_to_list, SUSCEPTIBLE
+
+# Version 3 dropped the global RNG state: random streams are derived from the seed in the metadata
+CHECKPOINT_VERSION = 3
+
+
+def _snapshot_queue(message_queue):
+    """Copies the pending messages of a queue.Queue without consuming them."""
+    with message_queue.mutex:
+        return [list(message) for message in message_queue.queue]
+
+
+class Checkpointer:
+    """
+    Periodically persists everything needed to resume a simulation bit-for-bit.
+
+    The checkpoint is an append-only JSON lines file. The first record holds the full
+    simulation (graph, node states, round index and pending queue), every
+    following record only holds the gossipers that changed since the previous one, plus
+    the adjacency and position of the nodes touched by churn. The middleware tracks those
+    nodes as they change, so a delta costs O(changes) rather than O(nodes).
+    Each record is flushed and fsync'ed, so a crash can at most lose the record being
+    written, which load_checkpoint() then ignores.
+
+    Parameters:
+    - filepath (str): Path of the checkpoint file.
+    - metadata (dict): Static run parameters stored in the base record (nodes, edges, fanout, seed...).
+    - every (int): Checkpoint once every `every` rounds.
+    - resume_from (dict): Checkpoint returned by load_checkpoint() for this same file when continuing
+      a run in it. The file is cut after its last valid record and new deltas are appended there.
+      Leave it unset to start a new file, its first record is then a base record.
+    """
+
+    def __init__(self, filepath: str, metadata: dict, every: int = 1, resume_from: dict = None):
+        self.logger = logging.getLogger(__name__)
+        self.filepath = filepath
+        self.metadata = metadata
+        self.every = max(1, every)
+        # Set once the file holds a base record that the next deltas apply to
+        self._has_base = False
+        if resume_from is not None:
+            # Drop a torn last record, otherwise the next delta would be glued to it
+            os.truncate(self.filepath, resume_from['offset'])
+            self._has_base = True
+
+    def _write_record(self, record: dict, mode: str):
+        with open(self.filepath, mode) as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def save(self, middleware, round_index: int, force: bool = False) -> bool:
+        """Writes a checkpoint for the given round if it is due. Returns True when one was written."""
+        if not force and round_index % self.every != 0:
+            return False
+
+        node_state = middleware.node_state
+        topology = middleware.pop_topology_changes()
+        dirty = middleware.pop_dirty_nodes()
+        record = {
+            'round': round_index,
+            'queue': _snapshot_queue(middleware.message_queue),
+        }
+
+        if not self._has_base:
+            record.update(self.metadata)
+            record.update({
+                'kind': 'base',
+                'version': CHECKPOINT_VERSION,
+                'adjacency_list': middleware.adjacency_list,
+                'coordinates': ndarray_to_list(middleware.node_coordinates),
+                'gossipers': middleware.gossiper_entries(range(len(node_state))),
+                'node_state': node_state.tolist(),
+            })
+            self._write_record(record, 'w')
+            self._has_base = True
+        else:
+            record.update({'kind': 'delta', 'gossipers': middleware.gossiper_entries(dirty.tolist()), 'topology': topology,
+                           'node_state': {'ids': dirty.tolist(), 'codes': node_state[dirty].tolist()}})
+            self._write_record(record, 'a')
+
+        self.logger.info(f"Checkpoint for round {round_index} written to {self.filepath}")
+        return True
+
+
+def _apply_topology_change(checkpoint: dict, node_id: int, entry: dict):
+    """Overwrites the adjacency and position of one node, growing the lists for joined nodes."""
+    adjacency_list = checkpoint['adjacency_list']
+    while len(adjacency_list) <= node_id:
+        adjacency_list.append([])
+    adjacency_list[node_id] = entry['adjacency']
+    checkpoint['coordinates'][str(node_id)] = entry['coordinates']
+
+
+def load_checkpoint(filepath: str) -> dict:
+    """
+    Rebuilds the latest consistent simulation state from a checkpoint file.
+
+    Returns:
+    - dict: The base record with gossipers, round and queue taken from the last complete delta,
+      and under 'offset' the byte offset right after that delta.
+    """
+    checkpoint = None
+    offset = 0
+    with open(filepath, 'rb') as f:
+        for line in f:
+            try:
+                # A record without its newline was cut while being written, even if it parses
+                if not line.endswith(b'\n'):
+                    raise ValueError("missing end of line")
+                record = json.loads(line)
+            except ValueError:
+                # Torn write at the end of the file, everything before it is still valid
+                logging.warning(f"Ignoring incomplete checkpoint record in {filepath}")
+                break
+            if record.get('kind') == 'base':
+                checkpoint = record
+            elif checkpoint is not None:
+                checkpoint['gossipers'].update(record['gossipers'])
+                for node, entry in record.get('topology', {}).items():
+                    _apply_topology_change(checkpoint, int(node), entry)
+                node_state = checkpoint['node_state']
+                for node, code in zip(record['node_state']['ids'], record['node_state']['codes']):
+                    node_state.extend([SUSCEPTIBLE] * (node + 1 - len(node_state)))
+                    node_state[node] = code
+                checkpoint['round'] = record['round']
+                checkpoint['queue'] = record['queue']
+            offset += len(line)
+
+    if checkpoint is None:
+        raise ValueError(f"No base checkpoint record found in {filepath}")
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {checkpoint.get('version')} in {filepath}")
+
+    # Peers that joined and never changed state are SUSCEPTIBLE
+    checkpoint['node_state'].extend([SUSCEPTIBLE] * (len(checkpoint['adjacency_list']) - len(checkpoint['node_state'])))
+    checkpoint['offset'] = offset
+    return checkpoint
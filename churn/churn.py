@@ -0,0 +1,99 @@
+import logging
+import numpy as np
+
+# Layout box of RandomGraph.random_layout, joining peers are placed inside it
+WIDTH_RANGE = (-6, 6)
+HEIGHT_RANGE = (-3.5, 3.5)
+
+
+def _event_count(rate: float, rng) -> int:
+    """Number of events this round for an expected `rate` per round: the integer part always
+    happens, the fractional part with that probability."""
+    count = int(rate)
+    if rng.random() < rate - count:
+        count += 1
+    return count
+
+
+class ChurnModel:
+    """
+    Applies peer join, leave and edge rewire events between gossip rounds, through the
+    incremental topology operations of the middleware (O(1)/O(degree) per event).
+
+    Randomness comes from the generator passed to step(), the churn stream of the round in
+    RandomStreams, so churn events are reproducible from the run's seed alone.
+
+    Parameters:
+    - join_rate (float): Expected number of peers joining per round.
+    - leave_rate (float): Expected number of online peers leaving per round.
+    - rewire_rate (float): Expected number of edges moved to another peer per round.
+    - join_degree (int): Number of online peers a joining peer connects to.
+    """
+
+    def __init__(self, join_rate: float = 0.0, leave_rate: float = 0.0, rewire_rate: float = 0.0, join_degree: int = 2):
+        self.logger = logging.getLogger(__name__)
+        self.join_rate = join_rate
+        self.leave_rate = leave_rate
+        self.rewire_rate = rewire_rate
+        self.join_degree = join_degree
+
+    @property
+    def is_active(self) -> bool:
+        return self.join_rate > 0 or self.leave_rate > 0 or self.rewire_rate > 0
+
+    def to_dict(self) -> dict:
+        """Parameters to store in a checkpoint, ChurnModel(**to_dict()) rebuilds the model."""
+        return {'join_rate': self.join_rate, 'leave_rate': self.leave_rate,
+                'rewire_rate': self.rewire_rate, 'join_degree': self.join_degree}
+
+    def _random_online_node(self, middleware, rng, exclude=(), tries: int = 32):
+        """Draws an online node not in `exclude`. Rejection sampling keeps it O(1) while most
+        peers are online; a scan only runs once the overlay has been mostly emptied."""
+        n_nodes = len(middleware.adjacency_list)
+        for _ in range(tries):
+            node = int(rng.integers(n_nodes))
+            if node not in exclude and middleware.is_online(node):
+                return node
+        candidates = [node for node in np.flatnonzero(middleware.online).tolist() if node not in exclude]
+        return candidates[int(rng.integers(len(candidates)))] if candidates else None
+
+    def _join(self, middleware, rng):
+        neighbors = []
+        for _ in range(self.join_degree):
+            neighbor = self._random_online_node(middleware, rng, exclude=neighbors)
+            if neighbor is None:
+                break
+            neighbors.append(neighbor)
+        position = [rng.uniform(*WIDTH_RANGE), rng.uniform(*HEIGHT_RANGE), rng.uniform(*HEIGHT_RANGE)]
+        node_id = middleware.add_node(neighbors, position)
+        return ('join', node_id, neighbors)
+
+    def _leave(self, middleware, rng):
+        node_id = self._random_online_node(middleware, rng)
+        if node_id is None:
+            return None
+        middleware.remove_node(node_id)
+        return ('leave', node_id)
+
+    def _rewire(self, middleware, rng):
+        source = self._random_online_node(middleware, rng)
+        if source is None or not middleware.adjacency_list[source]:
+            return None
+        old_target = middleware.adjacency_list[source][int(rng.integers(len(middleware.adjacency_list[source])))]
+        new_target = self._random_online_node(middleware, rng, exclude=set(middleware.adjacency_list[source]) | {source})
+        if new_target is None:
+            return None
+        middleware.rewire_edge(source, old_target, new_target)
+        return ('rewire', source, old_target, new_target)
+
+    def step(self, middleware, rng) -> list:
+        """Draws and applies this round's churn events with the given numpy Generator, returns the applied events."""
+        events = []
+        for action, rate in ((self._join, self.join_rate), (self._leave, self.leave_rate), (self._rewire, self.rewire_rate)):
+            for _ in range(_event_count(rate, rng)):
+                event = action(middleware, rng)
+                if event is not None:
+                    events.append(event)
+        if events:
+            self.logger.info(f"Churn events applied: {events}")
+        return events
@@ -1,63 +1,33 @@
 import threading
 import logging
-import json
-import os
 import traceback
-import tempfile
 
+from utils.utils import INFECTED, REMOVED
 
-gossiper_states = ['SUSCEPTIBLE', 'INFECTED', 'REMOVED']
 
-class Gossiper:
-    def __init__(self, node_id: int, state: str, message: str, fanout: int , repetitions: int, state_filepath: str, msg_queue, middleware):
-        self.logger = logging.getLogger(__name__)
-        self.lock = threading.Lock()
-        self.state_filepath = state_filepath
-        self.msg_queue = msg_queue
-        self.node_id = node_id
-        self.state = state
-        self.message = message
-        self.fanout = fanout
-        self.repetitions = repetitions
-        self.middleware = middleware
-    
+class GossipRound:
+    """
+    Behaviour of a gossiper during one event cycle. It only relies on the attributes node_id,
+    state, message, fanout, repetitions, state_filepath, msg_queue, middleware, logger and lock,
+    which Gossiper stores per instance and GossiperView reads from shared arrays.
+    """
+
+    __slots__ = ()
+
     def _persist_state(self):
-        """Save the gossiper's state to the state file in an atomic way."""
-        self.lock.acquire()
-        try:
-            # Read the existing state if the file isn't empty
-            if os.path.exists(self.state_filepath) and os.path.getsize(self.state_filepath) > 0:
-                with open(self.state_filepath, 'r') as file:
-                    state_file = json.load(file)
-            else:
-                state_file = {'gossipers': {}}
-
-            # Update this gossiper's state
-            state_file['gossipers'][str(self.node_id)] = {
-                'state': self.state,
-                'message': self.message,
-                'fanout': self.fanout,
-                'repetitions': self.repetitions
-            }
-
-            # Write the updated state to a temporary file
-            fd, temp_file_path = tempfile.mkstemp(dir=os.path.dirname(self.state_filepath))
-            with os.fdopen(fd, 'w') as temp_file:
-                json.dump(state_file, temp_file, indent=4)
-
-            # Atomically rename the temporary file to the original filename
-            os.replace(temp_file_path, self.state_filepath)
+        """Hand the gossiper's state over to the middleware, which owns the state file.
 
+        Going through the middleware keeps a single writer for the state file, so the
+        in-memory state, the file on disk and the checkpoints agree on the remaining
+        repetitions of every node.
+        """
+        try:
+            self.middleware.persist_gossiper(self.node_id, self.state, self.repetitions)
             self.logger.info(f"State persisted to {self.state_filepath}")
-
-        except json.JSONDecodeError as e:
-            self.logger.error(f"JSON decode error while reading state file: {e}")
         except IOError as e:
             self.logger.error(f"IO error while accessing state file: {e}")
         except Exception as e:
             self.logger.error(f"Unexpected error while persisting state: {e}")
-        finally:
-            self.lock.release()
 
     def _retrieve_fanout_nodes(self):
         """A simple method that contacts the middleware for a list of nodes."""
@@ -92,13 +62,13 @@ class Gossiper:
         - Node instantiated -> susceptible to infected
         - Node out of repetitions -> infected to removed
         """
-        if self.repetitions == 0 and self.state == gossiper_states[1]:
+        if self.repetitions == 0 and self.state == INFECTED:
             self.state = new_state
 
     def _lower_rep_count(self):
         """Lower repetition count by 1 after each event cycle down until reaching 0.
         """
-        if self.state == gossiper_states[1] and self.repetitions > 0:
+        if self.state == INFECTED and self.repetitions > 0:
             self.repetitions -= 1
             self.logger.info("Repetition count lowered.")
 
@@ -115,8 +85,97 @@ class Gossiper:
         self._lower_rep_count()
 
         if self.repetitions == 0:
-            self.udpate_state(gossiper_states[2])
+            self.udpate_state(REMOVED)
 
         self._persist_state()
 
-        return self.logger.info(f"Gossiper {self.node_id} finished running")
\ No newline at end of file
+        return self.logger.info(f"Gossiper {self.node_id} finished running")
+
+
+class Gossiper(GossipRound):
+    def __init__(self, node_id: int, state: int, message: str, fanout: int , repetitions: int, state_filepath: str, msg_queue, middleware):
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.state_filepath = state_filepath
+        self.msg_queue = msg_queue
+        self.node_id = node_id
+        self.state = state
+        self.message = message
+        self.fanout = fanout
+        self.repetitions = repetitions
+        self.middleware = middleware
+
+
+class GossiperContext:
+    """
+    Configuration shared by every gossiper of a round: one logger, lock, queue and middleware
+    reference for all of them instead of one set per gossiper.
+    """
+
+    def __init__(self, fanout: int, state_filepath: str, msg_queue, middleware):
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.fanout = fanout
+        self.state_filepath = state_filepath
+        self.msg_queue = msg_queue
+        self.middleware = middleware
+
+
+class GossiperView(GossipRound):
+    """
+    Flyweight gossiper: a node id and a shared GossiperContext, two slots in total. State and
+    remaining repetitions are read and written in place in the middleware's node_state and
+    repetitions_left arrays, the message is looked up through its message_index. Runs exactly
+    like a Gossiper built from the same entry.
+    """
+
+    __slots__ = ('node_id', 'context')
+
+    def __init__(self, node_id: int, context: GossiperContext):
+        self.node_id = node_id
+        self.context = context
+
+    @property
+    def state(self) -> int:
+        return int(self.context.middleware.node_state[self.node_id])
+
+    @state.setter
+    def state(self, value: int):
+        self.context.middleware.node_state[self.node_id] = value
+
+    @property
+    def repetitions(self) -> int:
+        return int(self.context.middleware.repetitions_left[self.node_id])
+
+    @repetitions.setter
+    def repetitions(self, value: int):
+        self.context.middleware.repetitions_left[self.node_id] = value
+
+    @property
+    def message(self) -> str:
+        middleware = self.context.middleware
+        return middleware.messages[middleware.message_index[self.node_id]]
+
+    @property
+    def fanout(self) -> int:
+        return self.context.fanout
+
+    @property
+    def state_filepath(self) -> str:
+        return self.context.state_filepath
+
+    @property
+    def msg_queue(self):
+        return self.context.msg_queue
+
+    @property
+    def middleware(self):
+        return self.context.middleware
+
+    @property
+    def logger(self):
+        return self.context.logger
+
+    @property
+    def lock(self):
+        return self.context.lock
\ No newline at end of file
@@ -1,6 +1,5 @@
 import networkx as nx
-import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
 import sys
 
 sys.setrecursionlimit(10000)
@@ -44,7 +43,7 @@ class RandomGraph:
     - n_degree (dict): A dictionary to store the degree distribution of nodes.
     """
 
-    def __init__(self, n_nodes=0, n_edges=0, is_directed=False, verbose=False):
+    def __init__(self, n_nodes=0, n_edges=0, is_directed=False, verbose=False, adjacency_list=None, node_coordinates=None, seed=None, layout_seed=None):
             """
             Initialize a RandomGraph object with the specified number of nodes and edges.
 
@@ -52,11 +51,22 @@ class RandomGraph:
             - n_nodes (int): The number of nodes in the graph.
             - n_edges (int): The number of edges in the graph.
             - is_directed (bool): True for directed graphs, False for undirected graphs.
+            - adjacency_list (list of lists): Rebuild a previously generated graph (e.g. from a checkpoint) instead of drawing a new one.
+            - node_coordinates (dict): Layout to reuse with adjacency_list, keyed by node.
+            - seed (int): Seed of the edge draw, e.g. RandomStreams.seed_for(RandomStreams.TOPOLOGY).
+            - layout_seed (int): Seed of the node layout, e.g. RandomStreams.seed_for(RandomStreams.LAYOUT).
             """
+            # A stored adjacency list may have grown or shrunk through churn
+            if adjacency_list is not None:
+                n_nodes = len(adjacency_list)
             self.n_nodes = n_nodes
             self.n_edges = n_edges
             self.is_directed = is_directed
             self.verbose = verbose
+            self.seed = seed
+            self.layout_seed = layout_seed
+            # Bumped by every churn operation, lets views skip redrawing an unchanged overlay
+            self.topology_version = 0
 
             # Check if the number of edges is appropriate for the number of nodes
             max_edges = self.n_nodes * (self.n_nodes - 1)
@@ -66,10 +76,18 @@ class RandomGraph:
                 raise ValueError(f"Number of edges cannot be more than {max_edges} for a {self.n_nodes} node {'directed' if is_directed else 'undirected'} graph")
 
             # Create a random graph using networkx
-            if self.is_directed:
-                self.graph = nx.gnm_random_graph(n=self.n_nodes, m=self.n_edges, directed=True)
+            self._adjacency_list = adjacency_list
+            self._in_adjacency_list = None
+            if node_coordinates is not None:
+                self._node_coordinates = {int(node): np.asarray(position, dtype=np.float32)
+                                          for node, position in sorted(node_coordinates.items(), key=lambda item: int(item[0]))}
+            if adjacency_list is not None:
+                self.graph = self._graph_from_adjacency_list(adjacency_list)
+                self.n_edges = self.graph.number_of_edges()
+            elif self.is_directed:
+                self.graph = nx.gnm_random_graph(n=self.n_nodes, m=self.n_edges, directed=True, seed=seed)
             else:
-                self.graph = nx.gnm_random_graph(n=self.n_nodes, m=self.n_edges, directed=False)
+                self.graph = nx.gnm_random_graph(n=self.n_nodes, m=self.n_edges, directed=False, seed=seed)
 
             # Initialize degree distribution dictionary
             self.n_degree = {i: 0 for i in range(n_nodes)}
@@ -79,6 +97,17 @@ class RandomGraph:
             if self.verbose:
                 print(f"Random {'directed' if is_directed else 'undirected'} graph with {n_nodes} nodes and {n_edges} edges created.")
 
+    def _graph_from_adjacency_list(self, adjacency_list):
+        """
+        Build the networkx graph back from an adjacency list without consuming any randomness.
+        """
+        graph = nx.DiGraph() if self.is_directed else nx.Graph()
+        graph.add_nodes_from(range(self.n_nodes))
+        for source, targets in enumerate(adjacency_list):
+            for target in targets:
+                graph.add_edge(source, target)
+        return graph
+
     def __repr__(self):
         """
         Return a string representation of the PlainGraph object.
@@ -104,6 +133,28 @@ class RandomGraph:
             self.set_nodes()
         return self.nodes
 
+    @property
+    def node_ids(self) -> list:
+        """
+        Get the list of node IDs in layout order, as used by the middleware and the animation.
+
+        Returns:
+        - list: A list of node IDs.
+        """
+        return list(self.node_coordinates.keys())
+
+    @property
+    def node_coordinates(self) -> dict:
+        """
+        Get the 3D layout of the nodes, computed once and cached.
+
+        Returns:
+        - dict: A dictionary of positions keyed by node.
+        """
+        if not hasattr(self, '_node_coordinates'):
+            self._node_coordinates = self.random_layout(dim=3, seed=self.layout_seed)
+        return self._node_coordinates
+
     def set_edges(self):
         """
         Set the list of edges in the graph.
@@ -150,11 +201,78 @@ class RandomGraph:
         Returns:
         - list of lists: An adjacency list where each index indicates a vertex, and the item is a list of adjacent vertices.
         """
-        #if not hasattr(self, 'adjacency_list'):
-        adjacency_list = self._create_adjacency_list()
-        if self.verbose:
-            print(f"Adjacency list for the graph: {adjacency_list}")
-        return adjacency_list
+        # Built once and then updated in place by the churn operations below. Keep the stored
+        # order when rebuilt from a checkpoint: fanout sampling depends on it
+        if self._adjacency_list is None:
+            self._adjacency_list = self._create_adjacency_list()
+            if self.verbose:
+                print(f"Adjacency list for the graph: {self._adjacency_list}")
+        return self._adjacency_list
+
+    @property
+    def in_adjacency_list(self):
+        """
+        Get the list of nodes pointing to each node. Same object as adjacency_list for undirected graphs.
+
+        Returns:
+        - list of lists: An adjacency list where each index indicates a vertex, and the item is a list of its in-neighbors.
+        """
+        if not self.is_directed:
+            return self.adjacency_list
+        if self._in_adjacency_list is None:
+            self._in_adjacency_list = [[] for _ in range(len(self.adjacency_list))]
+            for source, targets in enumerate(self.adjacency_list):
+                for target in targets:
+                    self._in_adjacency_list[target].append(source)
+        return self._in_adjacency_list
+
+    def add_node(self, position) -> int:
+        """
+        Append a new isolated node (a peer joining the overlay) in O(1).
+
+        Parameters:
+        - position (array-like): Layout coordinates of the new node.
+
+        Returns:
+        - int: The id of the new node.
+        """
+        node_id = len(self.adjacency_list)
+        self.adjacency_list.append([])
+        if self.is_directed:
+            self.in_adjacency_list.append([])
+        self.graph.add_node(node_id)
+        self.node_coordinates[node_id] = np.asarray(position, dtype=np.float32)
+        self.n_nodes += 1
+        if hasattr(self, 'nodes'):
+            self.nodes.append(node_id)
+        self.topology_version += 1
+        return node_id
+
+    def add_edge(self, source: int, target: int):
+        """
+        Connect two existing nodes in O(1), appending to the adjacency lists.
+        """
+        self.adjacency_list[source].append(target)
+        if self.is_directed:
+            self.in_adjacency_list[target].append(source)
+        else:
+            self.adjacency_list[target].append(source)
+        self.graph.add_edge(source, target)
+        self.n_edges += 1
+        self.topology_version += 1
+
+    def remove_edge(self, source: int, target: int):
+        """
+        Disconnect two nodes in O(degree), keeping the order of the remaining neighbors.
+        """
+        self.adjacency_list[source].remove(target)
+        if self.is_directed:
+            self.in_adjacency_list[target].remove(source)
+        else:
+            self.adjacency_list[target].remove(source)
+        self.graph.remove_edge(source, target)
+        self.n_edges -= 1
+        self.topology_version += 1
 
 
     def get_degree_distribution(self):
@@ -198,6 +316,31 @@ class RandomGraph:
         else:
             return nx.number_connected_components(self.graph)
 
+    def reachable_nodes(self, sources) -> np.ndarray:
+        """
+        Get the nodes a message starting from `sources` can reach by following edges.
+
+        Uses the connected component of each source (its descendants for directed graphs).
+        Sources already covered by a previous one are skipped, as their components are included
+        in it, so an undirected graph is traversed at most once.
+
+        Parameters:
+        - sources (iterable of int): Starting nodes, e.g. the seed or the current gossipers.
+
+        Returns:
+        - np.ndarray: Boolean mask indexed by node id.
+        """
+        reachable = np.zeros(len(self.adjacency_list), dtype=bool)
+        for source in sources:
+            if reachable[source]:
+                continue
+            if self.is_directed:
+                component = nx.descendants(self.graph, source) | {source}
+            else:
+                component = nx.node_connected_component(self.graph, source)
+            reachable[np.fromiter(component, dtype=np.int64, count=len(component))] = True
+        return reachable
+
     def random_layout(self, center=None, dim=2, seed=42):
         """Position nodes uniformly at random in the unit square.
 
@@ -265,6 +408,9 @@ class RandomGraph:
         return pos
     
     def plot_graph(self, filename='graph_edges.jpg', graph_title='List of edges'):
+        # Plotting is the only use of matplotlib, keep it out of headless simulation imports
+        import matplotlib.pyplot as plt
+
         plt.figure(figsize=(8, 6))
         nx.draw_random(self.graph, with_labels=False, font_weight='bold', node_size=40, width=0.2)
         plt.title(graph_title)
@@ -1,77 +1,202 @@
 import logging
-from threads.thread_manager import ThreadManager
 from parser.parser import parse_args
-from gossip.gossiper import Gossiper
-from middleware.p2p_service import *
-from anim.proyectile import Projectile
-from anim.graph_anim import Graph2D
-import random
-from manim import *
-from middleware.p2p_service import P2PService
-from utils.utils import ordered_list_from_dict
-import queue
-import time
-
-# Some render configs
-config.pixel_height = 1080  # Set the pixel height of the output video 2160
-config.pixel_width = 1920  # Set the pixel width of the output video 3840
-config.media_dir = "F:\\TheRabbitHole\\VlogDeUnNerd\\animations-code\\video-15"
-config.disable_caching = True
-
-# Configure the root logger
-logger = logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-
-# Parse arguments and seed system.
-args = parse_args()
-
-message_queue = queue.Queue()
-
-# Helper function
-def is_susceptible(node_status):
-    if 'SUSCEPTIBLE' in node_status:
-        logging.info('---------SUSCEPTIBLE NODES LEFT--------------')
-        return True
-    else:
-        return False
 
-if __name__ == "__main__":
+# Only the argument parser is imported eagerly: Manim, matplotlib and the simulation core are
+# loaded by the subcommand that needs them, so headless runs and sweep workers start fast.
+
+
+def _draw_seed(args):
+    """Draws the master seed when none was given, and logs it so the run can be reproduced."""
+    from utils.utils import RandomStreams
+
+    if args.seed is None:
+        args.seed = RandomStreams().seed
+    logging.info(f"Random streams seed: {args.seed}")
+
+
+def _load_run(args):
+    """Applies a checkpoint's run parameters to args and builds its Checkpointer and ChurnModel."""
+    import os
+    from checkpoint.checkpoint import Checkpointer, load_checkpoint
+    from churn.churn import ChurnModel
+
+    checkpoint = load_checkpoint(args.resume) if args.resume else None
+    message = 'Pim!!!'
+    churn = ChurnModel(args.join_rate, args.leave_rate, args.rewire_rate, args.join_degree)
+    if checkpoint is not None:
+        # Run parameters come from the checkpoint so the resumed run matches the original one
+        args.nodes, args.edges = checkpoint['nodes'], checkpoint['edges']
+        args.fanout, args.repetitions = checkpoint['fanout'], checkpoint['repetitions']
+        args.state_file = checkpoint['state_file']
+        args.seed = checkpoint['seed']
+        args.checkpoint = args.checkpoint or args.resume
+        message = checkpoint['message']
+        churn = ChurnModel(**checkpoint['churn'])
+    _draw_seed(args)
+    checkpointer = None
+    if args.checkpoint:
+        metadata = {'nodes': args.nodes, 'edges': args.edges, 'fanout': args.fanout, 'repetitions': args.repetitions,
+                    'message': message, 'state_file': args.state_file, 'churn': churn.to_dict(), 'seed': args.seed}
+        # Deltas only go on top of the resumed file, a different output file starts with a base record
+        same_file = args.resume is not None and os.path.abspath(args.checkpoint) == os.path.abspath(args.resume)
+        checkpointer = Checkpointer(args.checkpoint, metadata, every=args.checkpoint_every,
+                                    resume_from=checkpoint if same_file else None)
+    return checkpoint, checkpointer, message, churn if churn.is_active else None
+
+
+def _graph_kwargs(checkpoint, seed):
+    """Seeds a new graph from the topology and layout streams, or rebuilds the (possibly churned)
+    topology and layout stored in a checkpoint."""
+    from utils.utils import RandomStreams
+
+    streams = RandomStreams(seed)
+    kwargs = {'seed': streams.seed_for(RandomStreams.TOPOLOGY), 'layout_seed': streams.seed_for(RandomStreams.LAYOUT)}
+    if checkpoint is not None:
+        kwargs.update({'adjacency_list': checkpoint['adjacency_list'], 'node_coordinates': checkpoint['coordinates']})
+    return kwargs
+
+
+def simulate(args):
+    if args.rumors > 1:
+        return simulate_rumors(args)
+
+    from graph.graph import RandomGraph
+    from simulation.simulation import Simulation
+
+    checkpoint, checkpointer, message, churn = _load_run(args)
+    graph = RandomGraph(args.nodes, args.edges, **_graph_kwargs(checkpoint, args.seed))
+    simulation = Simulation(graph, args.state_file, args.fanout, args.repetitions, message=message,
+                            checkpoint=checkpoint, checkpointer=checkpointer, churn=churn, seed=args.seed)
+    summary = simulation.run()
+    logging.info(f"Simulation finished: {summary}")
+    if args.trace:
+        _append_trace(args.trace, simulation.trace_record())
+
+
+def simulate_rumors(args):
+    import json
+    from graph.graph import RandomGraph
+    from rumors.rumors import MultiRumorSimulation
+
+    _draw_seed(args)
+    graph = RandomGraph(args.nodes, args.edges, **_graph_kwargs(None, args.seed))
+    simulation = MultiRumorSimulation(graph, args.rumors, args.fanout, args.repetitions,
+                                      injection_interval=args.rumor_interval, seed=args.seed)
+    report = simulation.run()
+    logging.info(f"Multi-rumor simulation finished: {report['rounds']} rounds, mean coverage {report['mean_coverage']:.4f}")
+    print(json.dumps(report, indent=4))
+
+
+def _append_trace(filepath, record):
+    import json
+
+    with open(filepath, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def render(args):
+    if args.renderer == 'raster':
+        return render_raster(args)
+
+    from manim import config
+    from anim.graph_anim import Graph2D
+    from simulation.simulation import Simulation
+
+    # Some render configs
+    config.pixel_height = 1080  # Set the pixel height of the output video 2160
+    config.pixel_width = 1920  # Set the pixel width of the output video 3840
+    config.media_dir = args.media_dir
+    config.disable_caching = True
+
+    checkpoint, checkpointer, message, churn = _load_run(args)
     # Instantiate starting graph
-    graph = Graph2D(args.nodes, args.edges)
+    lod_cells = tuple(args.lod_grid) if args.lod_grid else None
+    graph = Graph2D(args.nodes, args.edges, lod_cells=lod_cells, show_edges=not args.no_edges,
+                    **_graph_kwargs(checkpoint, args.seed))
     # Bring middleware alive! Wake up princess.
-    middleservice = P2PService(graph, 'F:\\TheRabbitHole\\VlogDeUnNerd\\Video-15\\animations-code\\state_file.json', message_queue, args.fanout, args.repetitions)
-    # Instantiate original gossiper
-    message = 'Pim!!!'
-    node_og = random.choice(graph.node_ids)
-    seed = Gossiper(node_id= node_og, message=message, fanout=args.fanout, repetitions=args.repetitions, state = 'INFECTED', state_filepath=middleservice.state_file_path, middleware=middleservice, msg_queue=message_queue)
-    # Draw starting graph
-    graph.construct()
-    # State file persisted by OG gossiper. Dump to dict and pass to redraw graph
-    middleservice.update_state_file(seed.node_id, node_og, message)
-    # Update graph with original gossiper
-    graph.update_node_status(ordered_list_from_dict(middleservice.state_file['gossipers']), middleservice.state_file)
-    # Redraw graph
-    graph.construct()
+    simulation = Simulation(graph, args.state_file, args.fanout, args.repetitions, message=message, view=graph,
+                            cycle_delay=1, checkpoint=checkpoint, checkpointer=checkpointer, churn=churn, seed=args.seed)
+    summary = simulation.run()
+    logging.info(f"Simulation finished: {summary}")
+    if args.trace:
+        _append_trace(args.trace, simulation.trace_record())
+    graph.render(preview=True)
 
-    # Start event loop -> GOSSIP PROTOCOL starts here!!!
 
-    while is_susceptible(graph.node_status):
-        # Bring threadmanager
-        thread_manager = ThreadManager(middleservice, message_queue)
-        thread_manager.start_event_loop()
+def render_raster(args):
+    import os
+    from anim.raster import RasterRenderer, FFmpegWriter, PngSequenceWriter
+    from graph.graph import RandomGraph
+    from simulation.simulation import Simulation
 
-        time.sleep(2)
+    checkpoint, checkpointer, message, churn = _load_run(args)
+    graph = RandomGraph(args.nodes, args.edges, **_graph_kwargs(checkpoint, args.seed))
+    # A path with an extension is a video, anything else a directory of PNG frames
+    if os.path.splitext(args.output)[1]:
+        writer = FFmpegWriter(args.output, args.width, args.height, fps=args.fps)
+    else:
+        writer = PngSequenceWriter(args.output)
+    view = RasterRenderer(graph.node_coordinates, writer, width=args.width, height=args.height,
+                          frames_per_round=args.frames_per_round)
+    simulation = Simulation(graph, args.state_file, args.fanout, args.repetitions, message=message, view=view,
+                            checkpoint=checkpoint, checkpointer=checkpointer, churn=churn, seed=args.seed)
+    try:
+        summary = simulation.run()
+    finally:
+        view.close()
+    logging.info(f"Simulation finished: {summary}, frames written to {args.output}")
+    if args.trace:
+        _append_trace(args.trace, simulation.trace_record())
+
+
+def sweep(args):
+    import csv
+    import sys
+    from multiprocessing import Pool
+    from simulation.simulation import sweep_run
+
+    _draw_seed(args)
+    jobs = [{'nodes': args.nodes, 'edges': args.edges, 'fanout': fanout, 'repetitions': repetitions, 'run': run, 'seed': args.seed}
+            for fanout in args.fanout for repetitions in args.repetitions for run in range(args.runs)]
+
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = None
+        with Pool(processes=max(1, args.workers)) as pool:
+            for result, trace in pool.imap(sweep_run, jobs):
+                if args.trace:
+                    _append_trace(args.trace, {**result, **trace})
+                if writer is None:
+                    writer = csv.DictWriter(output, fieldnames=list(result.keys()))
+                    writer.writeheader()
+                writer.writerow(result)
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
 
-        logging.info(f"------------Reading Queue of messages--------")
 
-        middleservice.read_queue()
+def analyse(args):
+    import json
+    import itertools
+    from analytics.analytics import iter_runs, load_run, summarize_runs
 
-        node_status_i = ordered_list_from_dict(middleservice.state_file['gossipers'])
+    runs = itertools.chain.from_iterable(iter_runs(path) if path.endswith('.jsonl') else [load_run(path)]
+                                         for path in args.runs)
+    summary = summarize_runs(runs, fractions=args.coverage, batch_size=args.batch_size)
+    print(json.dumps(summary, indent=4))
+
+
+COMMANDS = {'simulate': simulate, 'render': render, 'sweep': sweep, 'analyse': analyse}
+
+if __name__ == "__main__":
+    # Parse arguments and seed system.
+    args = parse_args()
 
-        # Update graph
-        graph.update_node_status(node_status_i, middleservice.state_file)
-        graph.construct()
+    # Configure the root logger
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
 
-    graph.render(preview=True)
\ No newline at end of file
+    COMMANDS[args.command](args)
@@ -2,21 +2,36 @@ import os
 import json
 import sys
 import logging
-import random
+import queue
 from threading import Lock
 import time
+import tempfile
 from threading import Semaphore
+import numpy as np
 
 current_script_path = os.path.dirname(os.path.abspath(__file__))
 root_directory = os.path.abspath(os.path.join(current_script_path, ".."))  # Go up one level
 sys.path.append(root_directory)
 
-from anim.graph_anim import Graph2D
-from utils.utils import ndarray_to_list
+from utils.utils import ndarray_to_list, RandomStreams, STATE_DTYPE, SUSCEPTIBLE, INFECTED
+
+# Per node arrays of the middleware and their dtypes. Each one is a view over a larger buffer so
+# that joining peers append in amortized O(1) instead of reallocating the arrays.
+NODE_ARRAYS = {
+    'node_state': STATE_DTYPE,  # State codes, shared with the gossipers and the animation
+    'repetitions_left': np.int32,  # Remaining repetitions, read and written in place by the gossiper views
+    'online': bool,  # False once the peer left the overlay (churn)
+    'parent': np.int64,  # Node the rumor came from, the seed is its own parent and unreached nodes hold -1
+    'infection_round': np.int32,  # Round of the infection, -1 when never reached
+    'message_index': np.int32,  # Index of the node's message in P2PService.messages, 0 is the empty message
+}
 
 class P2PService:
-    def __init__(self, graph, filepath, message_queue, *args) -> None:
-        self.adjacency_list = graph.adjacency_list
+    def __init__(self, graph, filepath, message_queue, *args, resume: bool = False, streams: RandomStreams = None) -> None:
+        # Churn operations go through the RandomGraph, also when the graph is wrapped by Graph2D
+        self.topology = getattr(graph, 'random_graph', graph)
+        self.adjacency_list = self.topology.adjacency_list
+        self.in_adjacency_list = self.topology.in_adjacency_list
         self.node_coordinates = graph.node_coordinates
         self.node_ids = graph.node_ids
         self.state_file_path = filepath
@@ -25,30 +40,93 @@ class P2PService:
         self._state_file_lock = Lock()
         self._semaphore = Semaphore()
         self.message_queue = message_queue
-        if not os.path.exists(self.state_file_path) or not os.path.getsize(self.state_file_path) > 0:
-            print('HELLO')
-            self._create_state_file() 
-            self.state_file = self._load_state_file()
-  
+        # Fanout draws come from per (round, node) streams, so thread scheduling cannot change them
+        self.streams = streams if streams is not None else RandomStreams()
+        # Round being processed, recorded on every infection for the spreading analytics
+        self.round_index = 0
+        # Distinct message payloads, nodes only store an index into this list
+        self.messages = ['']
+        self._message_ids = {'': 0}
+        self._buffers = {}
+        self._create_state_file()
+        # A resumed run gets its state from the checkpoint through restore(), which then writes the
+        # state file. The file on disk may belong to another run, so it is never read back.
+        if not resume:
+            # Write the state file to the specified path
+            self._write_state_file()
+        # Nodes whose adjacency changed since the last checkpoint
+        self._topology_changes = set()
+        # Nodes whose state or gossiper entry changed since the last checkpoint
+        self._dirty_nodes = set()
+        self._build_susceptible_neighbors()
+
     def _create_state_file(self):
-        """Creates original state file and loads it as dict.
-        """
-        # Initialize the gossipers section with default data for each node
-        gossipers = {str(node_id): {'state': 'SUSCEPTIBLE',
-                                    'message': '',
-                                    'fanout': self.fanout,
-                                    'repetitions': self.repetitions,
-                                    'parent_node': -1}
-                     for node_id in self.node_ids}
-        node_coordinates = ndarray_to_list(self.node_coordinates)
+        """Creates the per node arrays of a fresh run and the in-memory state file sections.
+        The gossipers, coordinates and node_state sections are built from the arrays and the
+        layout when the state is written, so nodes cost no Python object in between."""
+        n_nodes = len(self.node_ids)
+        for name, value in self._new_node_values().items():
+            self._set_array(name, np.full(n_nodes, value, dtype=NODE_ARRAYS[name]))
         self.state_file = {
-            'gossipers': gossipers,  # Initialize as empty, not clear how it should be populated
-            'coordinates': node_coordinates,  # Use the coordinates from the constructor
             'adjacency_list': self.adjacency_list  # Use the adjacency list from the constructor
         }
-        # Write the state file to the specified path
-        with open(self.state_file_path, 'w') as f:
-            json.dump(self.state_file, f, indent=4)
+
+    def _new_node_values(self) -> dict:
+        """Array entries of a node that has not been reached yet."""
+        return {'node_state': SUSCEPTIBLE, 'repetitions_left': self.repetitions, 'online': True,
+                'parent': -1, 'infection_round': -1, 'message_index': 0}
+
+    def _set_array(self, name: str, values):
+        self._buffers[name] = np.array(values, dtype=NODE_ARRAYS[name])
+        setattr(self, name, self._buffers[name][:len(values)])
+
+    def _set_gossipers(self, gossipers: dict, node_state):
+        """Loads the arrays from the gossipers section of a state file or checkpoint."""
+        entries = [gossipers[str(node_id)] for node_id in range(len(node_state))]
+        self._set_array('node_state', node_state)
+        self._set_array('repetitions_left', [entry['repetitions'] for entry in entries])
+        self._set_array('online', [entry.get('online', True) for entry in entries])
+        self._set_array('parent', [int(entry['parent_node']) for entry in entries])
+        self._set_array('infection_round', [entry['infection_round'] for entry in entries])
+        self._set_array('message_index', [self._message_id(entry['message']) for entry in entries])
+
+    def _message_id(self, payload: str) -> int:
+        """Index of a payload in self.messages, added on first use."""
+        message_id = self._message_ids.get(payload)
+        if message_id is None:
+            message_id = self._message_ids[payload] = len(self.messages)
+            self.messages.append(payload)
+        return message_id
+
+    @staticmethod
+    def _append_to_buffer(buffer, n_items: int, value):
+        """Writes value after the n_items first entries of buffer, doubling it when full.
+        Returns the (possibly new) buffer and the view over its n_items + 1 first entries."""
+        if n_items == len(buffer):
+            grown = np.empty(max(2 * n_items, 1), dtype=buffer.dtype)
+            grown[:n_items] = buffer[:n_items]
+            buffer = grown
+        buffer[n_items] = value
+        return buffer, buffer[:n_items + 1]
+
+    def _append_node(self):
+        n_nodes = len(self.node_state)
+        for name, value in self._new_node_values().items():
+            self._buffers[name], view = self._append_to_buffer(self._buffers[name], n_nodes, value)
+            setattr(self, name, view)
+
+    def _write_state_file(self):
+        """Dumps the in-memory state to disk atomically through a temporary file.
+        Without a state file path (headless sweeps) the state only lives in memory."""
+        if not self.state_file_path:
+            return
+        fd, temp_file_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.state_file_path)))
+        with os.fdopen(fd, 'w') as temp_file:
+            json.dump({'gossipers': self.gossiper_entries(range(len(self.node_state))),
+                       'coordinates': ndarray_to_list(self.node_coordinates),
+                       **self.state_file,
+                       'node_state': self.node_state.tolist()}, temp_file, indent=4)
+        os.replace(temp_file_path, self.state_file_path)
 
     def _load_state_file(self):
         # Load the state file into the instance attribute
@@ -56,46 +134,155 @@ class P2PService:
             return json.load(f)
     
     def update_state_file(self, target_node_id: int, source_node_id: int, payload: str):
-        """Updates the state_file based on the target_node_id."""
+        """Records the infection of target_node_id by source_node_id. Only the in-memory arrays
+        change, the state file is written once per round by save_state_file()."""
         with self._state_file_lock:
-            node_id_str = str(target_node_id)
-            source_id_str = str(source_node_id)  # Ensure the node ID is a string for JSON keys
-            if node_id_str not in self.state_file['gossipers']:
-                # Initialize the gossiper state if it doesn't exist
-                self.state_file['gossipers'][node_id_str] = {
-                    'state': 'SUSCEPTIBLE',
-                    'message': '',
-                    'fanout': self.fanout,
-                    'repetitions': self.repetitions
-                }
+            target_node_id = int(target_node_id)
+            if not 0 <= target_node_id < len(self.node_state):
+                logging.warning(f"Dropping message for unknown node {target_node_id}")
+                return
             # Update the message for the gossiper
-            if not self.state_file['gossipers'][node_id_str]['state'] == 'INFECTED':
-                self.state_file['gossipers'][node_id_str]['message'] = payload
-                self.state_file['gossipers'][node_id_str]['state'] = 'INFECTED'
-                self.state_file['gossipers'][node_id_str]['parent_node'] = source_id_str
-        
-        # Write the updated state file to the specified path
-        with open(self.state_file_path, 'w') as f:
-            json.dump(self.state_file, f, indent=4)
+            # Only susceptible nodes can catch the rumor, REMOVED nodes stay removed
+            if self.node_state[target_node_id] == SUSCEPTIBLE:
+                self.node_state[target_node_id] = INFECTED
+                self.message_index[target_node_id] = self._message_id(payload)
+                self.parent[target_node_id] = int(source_node_id)
+                self.infection_round[target_node_id] = self.round_index
+                self._discard_susceptible(target_node_id)
+                self._dirty_nodes.add(target_node_id)
+
+    def persist_gossiper(self, node_id: int, state: int, repetitions: int):
+        """Records the state code and remaining repetitions reported by a gossiper after its run."""
+        with self._state_file_lock:
+            self.node_state[int(node_id)] = state
+            self.repetitions_left[int(node_id)] = repetitions
+            self._dirty_nodes.add(int(node_id))
+
+    def restore(self, checkpoint: dict):
+        """Replaces the node states and pending messages with the ones stored in a checkpoint."""
+        with self._state_file_lock:
+            self._set_gossipers(checkpoint['gossipers'], checkpoint['node_state'])
+            # The checkpoint already holds this state
+            self._dirty_nodes.clear()
+            self._write_state_file()
+        self._build_susceptible_neighbors()
+        for message in checkpoint['queue']:
+            self.message_queue.put(tuple(message))
 
     def get_random_fanout(self, source_node_id: int):
         """Returns a list of nodes that are in the SUSCEPTIBLE state and can be reached from the source node."""
         with self._semaphore:
             
-            # Get the neighbors of the source node from the adjacency list
-            neighbors = self.adjacency_list[source_node_id]
-            
-            # Filter the neighbors to include only those in SUSCEPTIBLE state
-            susceptible_neighbors = [node for node in neighbors if self.state_file['gossipers'].get(str(node), {}).get('state') == 'SUSCEPTIBLE']
+            # Neighbors of the source node still in SUSCEPTIBLE state, kept in adjacency order
+            susceptible_neighbors = self.susceptible_neighbors[source_node_id]
 
             # Determine the number of nodes to sample
             num_to_sample = min(len(susceptible_neighbors), self.fanout)
             
-            # Randomly select nodes from the susceptible neighbors
-            selected_nodes = random.sample(susceptible_neighbors, num_to_sample) if susceptible_neighbors else []
+            # Randomly select nodes from the susceptible neighbors, with the stream of this node in this round
+            rng = self.streams.generator(RandomStreams.FANOUT, self.round_index, source_node_id)
+            selected_nodes = [susceptible_neighbors[i] for i in rng.choice(len(susceptible_neighbors), size=num_to_sample, replace=False).tolist()]
             
             return selected_nodes
 
+    def _is_susceptible(self, node_id: int) -> bool:
+        return self.node_state[node_id] == SUSCEPTIBLE
+
+    def _build_susceptible_neighbors(self):
+        """Filters every adjacency list down to its SUSCEPTIBLE nodes. Runs once, infections and
+        churn events then keep the lists up to date incrementally."""
+        susceptible = (self.node_state == SUSCEPTIBLE).tolist()
+        self.susceptible_neighbors = [[node for node in neighbors if susceptible[node]]
+                                      for neighbors in self.adjacency_list]
+
+    def _discard_susceptible(self, node_id: int):
+        """A node left the SUSCEPTIBLE state: drop it from the lists of the nodes pointing to it, O(degree)."""
+        for source in self.in_adjacency_list[node_id]:
+            self.susceptible_neighbors[source].remove(node_id)
+
+    def _link(self, source: int, target: int):
+        self.topology.add_edge(source, target)
+        if self._is_susceptible(target):
+            self.susceptible_neighbors[source].append(target)
+        if not self.topology.is_directed and self._is_susceptible(source):
+            self.susceptible_neighbors[target].append(source)
+        self._topology_changes.update((source, target))
+
+    def _unlink(self, source: int, target: int):
+        self.topology.remove_edge(source, target)
+        if self._is_susceptible(target):
+            self.susceptible_neighbors[source].remove(target)
+        if not self.topology.is_directed and self._is_susceptible(source):
+            self.susceptible_neighbors[target].remove(source)
+        self._topology_changes.update((source, target))
+
+    def is_online(self, node_id: int) -> bool:
+        return bool(self.online[node_id])
+
+    def add_node(self, neighbors: list, position) -> int:
+        """A peer joins the overlay as a SUSCEPTIBLE node connected to `neighbors`. O(degree)."""
+        with self._state_file_lock:
+            node_id = self.topology.add_node(position)
+            self.susceptible_neighbors.append([])
+            self._append_node()
+            for neighbor in neighbors:
+                self._link(node_id, neighbor)
+            self._topology_changes.add(node_id)
+            self._dirty_nodes.add(node_id)
+        return node_id
+
+    def remove_node(self, node_id: int):
+        """A peer leaves the overlay: its edges are dropped and it stops gossiping. O(degree).
+        The id stays allocated so ids, state entries and positions of other nodes never move."""
+        with self._state_file_lock:
+            for target in list(self.adjacency_list[node_id]):
+                self._unlink(node_id, target)
+            if self.topology.is_directed:
+                for source in list(self.in_adjacency_list[node_id]):
+                    self._unlink(source, node_id)
+            self.online[node_id] = False
+            self._topology_changes.add(node_id)
+            self._dirty_nodes.add(node_id)
+
+    def rewire_edge(self, source: int, old_target: int, new_target: int):
+        """Moves one edge of `source` from `old_target` to `new_target`. O(degree)."""
+        with self._state_file_lock:
+            self._unlink(source, old_target)
+            self._link(source, new_target)
+
+    def pop_topology_changes(self) -> dict:
+        """Adjacency and position of every node touched by churn since the previous call."""
+        changes = {str(node): {'adjacency': list(self.adjacency_list[node]),
+                               'coordinates': ndarray_to_list(self.node_coordinates[node])}
+                   for node in sorted(self._topology_changes)}
+        self._topology_changes.clear()
+        return changes
+
+    def gossiper_entries(self, node_ids) -> dict:
+        """State file entries of the given gossipers, keyed by their string id, built from the arrays."""
+        node_ids = np.fromiter(node_ids, dtype=np.int64)
+        columns = zip(node_ids.tolist(), self.message_index[node_ids].tolist(), self.repetitions_left[node_ids].tolist(),
+                      self.parent[node_ids].tolist(), self.infection_round[node_ids].tolist(), self.online[node_ids].tolist())
+        return {str(node): {'message': self.messages[message],
+                            'fanout': self.fanout,
+                            'repetitions': repetitions,
+                            'parent_node': str(parent) if parent >= 0 else -1,
+                            'infection_round': infection_round,
+                            'online': online}
+                for node, message, repetitions, parent, infection_round, online in columns}
+
+    def save_state_file(self):
+        """Persists the state once per round. Infections, gossiper runs and churn events only
+        update the in-memory arrays, so a round costs a single write whatever its size."""
+        with self._state_file_lock:
+            self._write_state_file()
+
+    def pop_dirty_nodes(self) -> np.ndarray:
+        """Sorted ids of the nodes whose state or gossiper entry changed since the previous call."""
+        dirty = np.fromiter(sorted(self._dirty_nodes), dtype=np.int64, count=len(self._dirty_nodes))
+        self._dirty_nodes.clear()
+        return dirty
+
     def _deserialize_message(self, payload: str):
         """Unpacks the message structure and returns its components."""
         message, source_node_id, target_node_id = payload
@@ -115,18 +302,23 @@ class P2PService:
             # Wait a bit before checking again
             time.sleep(0.1)  # Sleep for 100ms
 
+        # Drain the round's messages and apply them in (target, source) order rather than arrival
+        # order, so the parent credited for an infection does not depend on thread scheduling
+        messages = []
         while not self.message_queue.empty():
             try:
-                # Get the next message from the queue
-                message_data = self.message_queue.get_nowait()
-                
+                messages.append(self.message_queue.get_nowait())
+            except queue.Empty:
+                break  # Exit if the queue is empty
+        messages.sort(key=lambda message: (int(message[2]), int(message[1])))
+
+        for message_data in messages:
+            try:
                 # Deserialize the message
                 message, source_node_id, target_node_id = self._deserialize_message(message_data)
                 
                 # Update the state file based on the target node_id
                 self.update_state_file(target_node_id, source_node_id, message)
-            except self.message_queue.Empty:
-                break  # Exit if the queue is empty
             except Exception as e:
                 # Print the error message and exit
                 logging.error(f"Error processing message: {e}")
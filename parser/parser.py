@@ -1,35 +1,198 @@
 import argparse
 
+DEFAULT_STATE_FILE = "state_file.json"
+
 def positive_integer(value):
     ivalue = int(value)
     if ivalue < 0:
         raise argparse.ArgumentTypeError(f"{value} is an invalid positive int value")
     return ivalue
 
-def parse_args():
-    parser = argparse.ArgumentParser(description="Select fanout and msg repetitions per node.")
+def _add_graph_arguments(parser, multiple=False):
+    """Graph size and gossip parameters. A sweep accepts several fanout/repetition values."""
+    nargs = '+' if multiple else None
     parser.add_argument("-n",
                         "--nodes",
-                        required=True,
                         type=lambda fn: positive_integer(fn),
                         help="Number of nodes in the graph, V")
     parser.add_argument("-e",
                         "--edges",
-                        required=True,
                         type=lambda fn: positive_integer(fn),
                         help="Number of edges in the graph, E.")
     parser.add_argument("-f",
                         "--fanout",
-                        required=True,
+                        nargs=nargs,
                         type=lambda fn: positive_integer(fn),
                         help="Select fanout (number of forwarding nodes)")
     parser.add_argument("-r",
                         "--repetitions",
-                        required=True,
+                        nargs=nargs,
                         type=lambda fn: positive_integer(fn),
                         help="Number of times the same message is sent by a single node.")
-    
+
+def _add_run_arguments(parser):
+    """State file and checkpointing options shared by single runs (simulate and render)."""
+    parser.add_argument("-s",
+                        "--state-file",
+                        default=None,
+                        help=f"Path of the JSON state file shared by the middleware and the gossipers. Defaults to {DEFAULT_STATE_FILE}, "
+                             "except for the raster renderer which keeps the state in memory unless a path is given.")
+    parser.add_argument("-c",
+                        "--checkpoint",
+                        default=None,
+                        help="Path of the checkpoint file written while the simulation runs.")
+    parser.add_argument("--checkpoint-every",
+                        default=1,
+                        type=lambda fn: positive_integer(fn),
+                        help="Number of rounds between two checkpoints.")
+    parser.add_argument("--resume",
+                        default=None,
+                        help="Continue a simulation from the last record of the given checkpoint file.")
+    _add_trace_argument(parser)
+    _add_seed_argument(parser)
+    _add_churn_arguments(parser)
+
+def _add_churn_arguments(parser):
+    """Overlay churn applied between rounds. All rates default to 0, i.e. a static graph."""
+    parser.add_argument("--join-rate",
+                        default=0.0,
+                        type=float,
+                        help="Expected number of peers joining the overlay per round.")
+    parser.add_argument("--leave-rate",
+                        default=0.0,
+                        type=float,
+                        help="Expected number of peers leaving the overlay per round.")
+    parser.add_argument("--rewire-rate",
+                        default=0.0,
+                        type=float,
+                        help="Expected number of edges moved to another peer per round.")
+    parser.add_argument("--join-degree",
+                        default=2,
+                        type=lambda fn: positive_integer(fn),
+                        help="Number of online peers a joining peer connects to.")
+
+def _add_seed_argument(parser):
+    parser.add_argument("--seed",
+                        default=None,
+                        type=lambda fn: positive_integer(fn),
+                        help="Master seed of the random streams (graph, layout, seed node, fanout, churn). Drawn and logged when omitted.")
+
+def _add_trace_argument(parser):
+    parser.add_argument("-t",
+                        "--trace",
+                        default=None,
+                        help="JSON lines file receiving the infection tree (parents and infection rounds) of each run.")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Select fanout and msg repetitions per node.")
+    parser.add_argument("--log-level",
+                        default="INFO",
+                        help="Root logger level (DEBUG, INFO, WARNING...).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    simulate = subparsers.add_parser("simulate", help="Run the gossip protocol headless, without Manim.")
+    _add_graph_arguments(simulate)
+    _add_run_arguments(simulate)
+    simulate.add_argument("--rumors",
+                          default=1,
+                          type=lambda fn: positive_integer(fn),
+                          help="Number of concurrent rumors. Above 1, runs the vectorized multi-rumor mode and prints a per-rumor report.")
+    simulate.add_argument("--rumor-interval",
+                          default=0,
+                          type=lambda fn: positive_integer(fn),
+                          help="Rounds between the injection of two consecutive rumors in multi-rumor mode.")
+
+    render = subparsers.add_parser("render", help="Run the gossip protocol and animate it with Manim or the raster renderer.")
+    _add_graph_arguments(render)
+    _add_run_arguments(render)
+    render.add_argument("--media-dir",
+                        default="media",
+                        help="Directory where Manim writes the rendered video.")
+    render.add_argument("--lod-grid",
+                        nargs=2,
+                        default=None,
+                        type=lambda fn: positive_integer(fn),
+                        metavar=("COLUMNS", "ROWS"),
+                        help="Manim level of detail: draw one glyph per grid cell and transmission bundles between cells.")
+    render.add_argument("--no-edges",
+                        action="store_true",
+                        help="Manim: do not draw the overlay edges nor highlight the ones used each round.")
+    render.add_argument("--renderer",
+                        default="manim",
+                        choices=["manim", "raster"],
+                        help="Manim scene, or NumPy rasterizer for graphs too large for Manim.")
+    render.add_argument("-o",
+                        "--output",
+                        default="gossip.mp4",
+                        help="Raster renderer output: a video file encoded by ffmpeg, or a directory of PNG frames.")
+    render.add_argument("--width",
+                        default=1920,
+                        type=lambda fn: positive_integer(fn),
+                        help="Raster renderer frame width in pixels.")
+    render.add_argument("--height",
+                        default=1080,
+                        type=lambda fn: positive_integer(fn),
+                        help="Raster renderer frame height in pixels.")
+    render.add_argument("--fps",
+                        default=30,
+                        type=lambda fn: positive_integer(fn),
+                        help="Raster renderer video frame rate.")
+    render.add_argument("--frames-per-round",
+                        default=15,
+                        type=lambda fn: positive_integer(fn),
+                        help="Raster renderer frames written for each gossip round.")
+
+    sweep = subparsers.add_parser("sweep", help="Run headless simulations over a grid of fanout and repetition values.")
+    _add_graph_arguments(sweep, multiple=True)
+    sweep.add_argument("--runs",
+                       default=1,
+                       type=lambda fn: positive_integer(fn),
+                       help="Number of runs per (fanout, repetitions) pair.")
+    sweep.add_argument("-w",
+                       "--workers",
+                       default=1,
+                       type=lambda fn: positive_integer(fn),
+                       help="Number of worker processes.")
+    sweep.add_argument("-o",
+                       "--output",
+                       default=None,
+                       help="CSV file receiving one line per run, stdout when omitted.")
+    _add_trace_argument(sweep)
+    _add_seed_argument(sweep)
+
+    analyse = subparsers.add_parser("analyse", help="Infection tree analytics over recorded runs.")
+    analyse.add_argument("runs",
+                         nargs='+',
+                         help="Traces (.jsonl, one run per line) and/or JSON state files.")
+    analyse.add_argument("--coverage",
+                         nargs='+',
+                         default=[0.5, 0.9, 0.99, 1.0],
+                         type=float,
+                         help="Coverage fractions reported by time-to-coverage.")
+    analyse.add_argument("--batch-size",
+                         default=64,
+                         type=lambda fn: positive_integer(fn),
+                         help="Runs analysed together in one vectorized batch.")
+
     # Parse arguments before further validation
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    # Graph and gossip parameters are stored in the checkpoint when resuming
+    if args.command != 'analyse' and getattr(args, 'resume', None) is None:
+        missing = [f"--{name}" for name in ('nodes', 'edges', 'fanout', 'repetitions') if getattr(args, name) is None]
+        if missing:
+            parser.error(f"the following arguments are required: {', '.join(missing)}")
+
+    # The raster renderer targets graphs far too large to rewrite a JSON state file every round
+    if getattr(args, 'state_file', False) is None and getattr(args, 'renderer', None) != 'raster':
+        args.state_file = DEFAULT_STATE_FILE
+
+    # The multi-rumor mode runs on a static overlay, without state file, checkpoints or traces
+    if getattr(args, 'rumors', 1) > 1:
+        unsupported = [option for option, value in (('--checkpoint', args.checkpoint), ('--resume', args.resume), ('--trace', args.trace),
+                                                    ('--join-rate', args.join_rate), ('--leave-rate', args.leave_rate),
+                                                    ('--rewire-rate', args.rewire_rate)) if value]
+        if unsupported:
+            parser.error(f"--rumors above 1 does not support {', '.join(unsupported)}")
 
-    return args
\ No newline at end of file
+    return args
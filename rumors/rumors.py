@@ -0,0 +1,206 @@
+import os
+import sys
+import logging
+import numpy as np
+
+current_script_path = os.path.dirname(os.path.abspath(__file__))
+root_directory = os.path.abspath(os.path.join(current_script_path, ".."))  # Go up one level
+sys.path.append(root_directory)
+
+from analytics.analytics import time_to_coverage, DEFAULT_COVERAGE
+from utils.utils import RandomStreams
+
+# Multi-rumor mode: every node holds a bitset of the rumors it knows, packed in uint64 words
+# (bit r % 64 of word r // 64 is rumor r). A round is a handful of array operations over all
+# nodes and all rumors at once, so hundreds of concurrent rumors cost little more than one.
+
+WORD_BITS = 64
+WORD_DTYPE = np.uint64
+
+
+def n_words(n_rumors: int) -> int:
+    """Number of uint64 words needed to hold one bit per rumor."""
+    return max(1, -(-n_rumors // WORD_BITS))
+
+
+def rumor_mask(rumors, n_rumors: int) -> np.ndarray:
+    """Bitset with the bits of the given rumor ids set."""
+    mask = np.zeros(n_words(n_rumors), dtype=WORD_DTYPE)
+    for rumor in np.atleast_1d(rumors).tolist():
+        mask[rumor // WORD_BITS] |= WORD_DTYPE(1) << WORD_DTYPE(rumor % WORD_BITS)
+    return mask
+
+
+def count_bits(bitsets, n_rumors: int) -> np.ndarray:
+    """Number of bitsets, out of a (N, words) array, holding each rumor. Shape (n_rumors,)."""
+    if len(bitsets) == 0:
+        return np.zeros(n_rumors, dtype=np.int64)
+    # Little endian bytes + little bit order puts rumor r at position r of the unpacked row
+    bits = np.unpackbits(np.ascontiguousarray(bitsets, dtype='<u8').view(np.uint8), axis=1, bitorder='little')
+    return bits[:, :n_rumors].sum(axis=0, dtype=np.int64)
+
+
+class MultiRumorSimulation:
+    """
+    Spreads many rumors concurrently over a static overlay with the same push protocol as
+    Simulation: a node forwards a rumor during the `repetitions` rounds after learning it, each
+    round to up to `fanout` distinct neighbors that are still missing one of its rumors.
+
+    A node sends a single message per target carrying the batch of all the rumors it is
+    currently forwarding, and a target learns the union of the batches it receives. Messages
+    are (source, target, bitset) rows and are merged per target with bitwise OR reductions.
+
+    Parameters:
+    - graph: Any graph exposing adjacency_list (RandomGraph or Graph2D).
+    - n_rumors (int): Number of concurrent rumors.
+    - fanout (int): Number of forwarding nodes per gossiper.
+    - repetitions (int): Number of rounds a node forwards a rumor after learning it.
+    - injection_interval (int): Rounds between the injection of two consecutive rumors, 0 injects them all at once.
+    - max_rounds (int): Safety bound on the number of rounds, None runs until no rumor is forwarded anymore.
+    - seed (int): Master seed of the random streams, None draws one (see RandomStreams).
+    """
+
+    def __init__(self, graph, n_rumors: int, fanout: int, repetitions: int, injection_interval: int = 0,
+                 max_rounds: int = None, seed: int = None):
+        if n_rumors < 1:
+            raise ValueError(f"At least one rumor is needed, got {n_rumors}")
+        if repetitions < 1:
+            raise ValueError(f"Rumors are only forwarded with at least one repetition, got {repetitions}")
+        self.logger = logging.getLogger(__name__)
+        self.n_rumors = n_rumors
+        self.fanout = fanout
+        self.repetitions = repetitions
+        self.injection_interval = injection_interval
+        self.max_rounds = max_rounds
+
+        # CSR adjacency: neighbors of node i are indices[indptr[i]:indptr[i + 1]]
+        adjacency_list = getattr(graph, 'random_graph', graph).adjacency_list
+        self.n_nodes = len(adjacency_list)
+        degrees = np.fromiter((len(neighbors) for neighbors in adjacency_list), dtype=np.int64, count=self.n_nodes)
+        self.indptr = np.concatenate(([0], np.cumsum(degrees)))
+        self.indices = np.fromiter((node for neighbors in adjacency_list for node in neighbors), dtype=np.int64,
+                                   count=int(self.indptr[-1]))
+
+        words = n_words(n_rumors)
+        self.known = np.zeros((self.n_nodes, words), dtype=WORD_DTYPE)
+        # forwarding[slot] holds the rumors learned in a round congruent to slot modulo repetitions,
+        # the slot is recycled exactly when those rumors have been forwarded `repetitions` times
+        self.forwarding = np.zeros((repetitions, self.n_nodes, words), dtype=WORD_DTYPE)
+        # Target selection is vectorized over all nodes, so one stream per round replaces the per node ones
+        self.streams = RandomStreams(seed)
+        self.seeds = self.streams.generator(RandomStreams.SEED_NODE).integers(self.n_nodes, size=n_rumors)
+        self.injection_round = np.arange(n_rumors, dtype=np.int64) * injection_interval
+        # new_counts[round, rumor]: nodes that learned the rumor in that round
+        self._new_counts = []
+        self.round_index = 0
+        self.messages = 0
+
+    def _inject(self, round_index: int):
+        """Seeds the rumors scheduled for this round, as if their seed learned them in it."""
+        learned = np.zeros((self.n_nodes, self.known.shape[1]), dtype=WORD_DTYPE)
+        for rumor in np.flatnonzero(self.injection_round == round_index).tolist():
+            learned[self.seeds[rumor]] |= rumor_mask(rumor, self.n_rumors)
+        return learned
+
+    def _select_targets(self, active: np.ndarray):
+        """
+        Picks up to `fanout` distinct neighbors per forwarding node among the ones missing at
+        least one of its forwarded rumors, the multi-rumor counterpart of get_random_fanout().
+
+        Returns:
+        - tuple: (sources, targets) arrays, one entry per message.
+        """
+        senders = np.flatnonzero(active.any(axis=1))
+        degrees = self.indptr[senders + 1] - self.indptr[senders]
+        # Expand the adjacency rows of the senders into (source, target) edge arrays
+        sources = np.repeat(senders, degrees)
+        offsets = np.arange(len(sources)) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+        targets = self.indices[np.repeat(self.indptr[senders], degrees) + offsets]
+        useful = (active[sources] & ~self.known[targets]).any(axis=1)
+        sources, targets = sources[useful], targets[useful]
+        # Random order within each sender's row, then keep the first `fanout` of every row
+        rng = self.streams.generator(RandomStreams.RUMORS, self.round_index)
+        order = np.lexsort((rng.random(len(sources)), sources))
+        sources, targets = sources[order], targets[order]
+        row_start = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1]]) if len(sources) else np.zeros(0, dtype=np.int64)
+        rank = np.arange(len(sources)) - np.repeat(row_start, np.diff(np.r_[row_start, len(sources)]))
+        keep = rank < self.fanout
+        return sources[keep], targets[keep]
+
+    def step(self) -> np.ndarray:
+        """Runs a single round and returns the number of nodes that learned each rumor in it."""
+        self.round_index += 1
+        slot = self.round_index % self.repetitions
+        active = np.bitwise_or.reduce(self.forwarding, axis=0)
+        sources, targets = self._select_targets(active)
+        self.messages += len(sources)
+
+        learned = self._inject(self.round_index)
+        if len(targets):
+            # Merge every batch addressed to the same target with one OR reduction per target
+            order = np.argsort(targets, kind='stable')
+            targets, payload = targets[order], active[sources[order]]
+            starts = np.flatnonzero(np.r_[True, targets[1:] != targets[:-1]])
+            learned[targets[starts]] |= np.bitwise_or.reduceat(payload, starts, axis=0)
+        learned &= ~self.known
+        self.known |= learned
+        # Rumors learned `repetitions` rounds ago were just forwarded for the last time
+        self.forwarding[slot] = learned
+        new_counts = count_bits(learned, self.n_rumors)
+        self._new_counts.append(new_counts)
+        return new_counts
+
+    def start(self):
+        """Injects the rumors of round 0."""
+        learned = self._inject(0)
+        self.known |= learned
+        self.forwarding[0] = learned
+        self._new_counts.append(count_bits(learned, self.n_rumors))
+
+    def is_active(self) -> bool:
+        """True while a rumor is being forwarded or still waits for its injection."""
+        return bool(self.forwarding.any()) or bool(np.any(self.injection_round > self.round_index))
+
+    def run(self) -> dict:
+        """Runs rounds until no rumor is forwarded anymore and returns the per-rumor report."""
+        self.start()
+        while self.is_active() and (self.max_rounds is None or self.round_index < self.max_rounds):
+            self.step()
+            self.logger.info(f"Round {self.round_index}: {int(self._new_counts[-1].sum())} rumor deliveries")
+        return self.report()
+
+    def spread_curves(self) -> np.ndarray:
+        """Cumulative number of nodes knowing each rumor at the end of each round, shape (n_rumors, rounds)."""
+        return np.cumsum(np.asarray(self._new_counts), axis=0).T
+
+    def report(self, fractions=DEFAULT_COVERAGE) -> dict:
+        """Coverage and latency of every rumor, latencies counted from the rumor's injection round."""
+        curves = self.spread_curves()
+        new_counts = np.asarray(self._new_counts).T
+        reached = curves[:, -1]
+        rounds = np.arange(new_counts.shape[1])
+        # Mean number of rounds between injection and delivery over the nodes a rumor reached
+        latency_sum = (new_counts * (rounds[None, :] - self.injection_round[:, None])).sum(axis=1)
+        coverage_rounds = time_to_coverage(curves, self.n_nodes, fractions)
+        rumors = []
+        for rumor in range(self.n_rumors):
+            injected = int(self.injection_round[rumor])
+            rumors.append({
+                'rumor': rumor,
+                'seed': int(self.seeds[rumor]),
+                'injection_round': injected,
+                'reached': int(reached[rumor]),
+                'coverage': float(reached[rumor] / self.n_nodes),
+                'mean_latency': float(latency_sum[rumor] / reached[rumor]) if reached[rumor] else 0.0,
+                'max_latency': int(np.flatnonzero(new_counts[rumor]).max(initial=injected) - injected),
+                'time_to_coverage': {fraction: int(found[rumor] - injected) if found[rumor] >= 0 else -1
+                                     for fraction, found in coverage_rounds.items()},
+            })
+        return {
+            'rounds': self.round_index,
+            'nodes': self.n_nodes,
+            'rumors': self.n_rumors,
+            'messages': self.messages,
+            'mean_coverage': float(reached.mean() / self.n_nodes),
+            'per_rumor': rumors,
+        }
@@ -0,0 +1,203 @@
+import os
+import sys
+import logging
+import queue
+import time
+import numpy as np
+
+current_script_path = os.path.dirname(os.path.abspath(__file__))
+root_directory = os.path.abspath(os.path.join(current_script_path, ".."))  # Go up one level
+sys.path.append(root_directory)
+
+from threads.thread_manager import ThreadManager
+from gossip.gossiper import Gossiper
+from middleware.p2p_service import P2PService
+from analytics.analytics import predict_remaining_rounds
+from utils.utils import RandomStreams, SUSCEPTIBLE, INFECTED
+
+# Nothing in here may import manim or matplotlib: headless runs and sweep workers import this module.
+
+
+class Simulation:
+    """
+    Drives the gossip protocol round by round, with or without an animation attached.
+
+    Parameters:
+    - graph: Any graph exposing adjacency_list, node_coordinates and node_ids (RandomGraph or Graph2D).
+    - state_file_path (str): Path of the JSON state file, None keeps the state in memory only.
+    - fanout (int): Number of forwarding nodes per gossiper.
+    - repetitions (int): Number of times the same message is sent by a single node.
+    - message (str): Rumor spread by the original gossiper.
+    - view (Graph2D or RasterRenderer): Scene redrawn after every round, None for headless runs.
+    - cycle_delay (float): Seconds slept between rounds to pace a live render, 0 for headless runs.
+    - checkpoint (dict): Checkpoint returned by load_checkpoint() to resume from.
+    - checkpointer (Checkpointer): Writes periodic checkpoints while running.
+    - churn (ChurnModel): Join/leave/rewire events applied between rounds, None for a static overlay.
+    - seed (int): Master seed of the run's random streams, None draws one (see RandomStreams).
+    - run (int): Run index within a sweep, each run gets its own streams for the same seed.
+    """
+
+    def __init__(self, graph, state_file_path, fanout, repetitions, message='Pim!!!', view=None,
+                 cycle_delay=0, checkpoint=None, checkpointer=None, churn=None, seed=None, run=0):
+        self.logger = logging.getLogger(__name__)
+        self.graph = graph
+        self.view = view
+        self.cycle_delay = cycle_delay
+        self.message = message
+        self.fanout = fanout
+        self.repetitions = repetitions
+        self.checkpoint = checkpoint
+        self.checkpointer = checkpointer
+        self.churn = churn
+        self.message_queue = queue.Queue()
+        self.streams = RandomStreams(seed, run)
+        self.middleservice = P2PService(graph, state_file_path, self.message_queue, fanout, repetitions,
+                                        resume=checkpoint is not None, streams=self.streams)
+        self.round_index = 0
+        # Nodes the current gossipers can still reach, and reached node count after each round
+        self.reachable = None
+        self.spread = []
+        self.predicted_remaining = None
+
+    @property
+    def node_status(self) -> np.ndarray:
+        """uint8 state codes indexed by node id, shared with the middleware."""
+        return self.middleservice.node_state
+
+    def _redraw(self, node_status):
+        if self.view is not None:
+            self.view.update_node_status(node_status, self.middleservice)
+            self.view.construct()
+
+    def start(self):
+        """Seeds the original gossiper, or restores the checkpointed state when resuming."""
+        if self.view is not None:
+            # Draw starting graph
+            self.view.construct()
+        if self.checkpoint is not None:
+            # Pick up node states and pending messages, the random streams only depend on the seed and round
+            self.middleservice.restore(self.checkpoint)
+            self.round_index = self.checkpoint['round']
+            self.middleservice.round_index = self.round_index
+            self.logger.info(f"------------Resuming from round {self.round_index}--------")
+        else:
+            # Instantiate original gossiper
+            node_ids = self.graph.node_ids
+            node_og = node_ids[int(self.streams.generator(RandomStreams.SEED_NODE).integers(len(node_ids)))]
+            seed = Gossiper(node_id=node_og, message=self.message, fanout=self.fanout, repetitions=self.repetitions, state=INFECTED,
+                            state_filepath=self.middleservice.state_file_path, middleware=self.middleservice, msg_queue=self.message_queue)
+            # State file persisted by OG gossiper
+            self.middleservice.update_state_file(seed.node_id, node_og, self.message)
+            self.middleservice.save_state_file()
+            if self.checkpointer is not None:
+                self.checkpointer.save(self.middleservice, self.round_index, force=True)
+        self._update_reachability()
+        self._record_spread()
+        self._redraw(self.node_status)
+
+    def _active_gossipers(self) -> list:
+        """Online INFECTED nodes, the frontier that can still spread the rumor."""
+        return np.flatnonzero((self.middleservice.node_state == INFECTED) & self.middleservice.online).tolist()
+
+    def _update_reachability(self):
+        """Recomputes the nodes reachable from the frontier. Without churn the topology never
+        changes, so this only runs after seeding (or resuming) and after churn events."""
+        self.reachable = self.middleservice.topology.reachable_nodes(self._active_gossipers())
+        self.logger.info(f"{int(np.count_nonzero(self.reachable))} of {len(self.reachable)} nodes reachable from the gossipers")
+
+    def _record_spread(self):
+        """Appends the reached node count of the round and refreshes the rounds remaining estimate."""
+        self.spread.append(int(np.count_nonzero(self.node_status != SUSCEPTIBLE)))
+        n_target = self.n_reachable
+        self.predicted_remaining = predict_remaining_rounds(self.spread, n_target)
+        if self.predicted_remaining is not None:
+            self.logger.info(f"Round {self.round_index}: {self.spread[-1]}/{n_target} reachable nodes reached, "
+                             f"about {self.predicted_remaining} rounds remaining")
+
+    def step(self) -> np.ndarray:
+        """Runs a single gossip round and returns the resulting node state codes."""
+        self.round_index += 1
+        self.middleservice.round_index = self.round_index
+        churn_events = []
+        if self.churn is not None:
+            churn_events = self.churn.step(self.middleservice, self.streams.generator(RandomStreams.CHURN, self.round_index))
+        thread_manager = ThreadManager(self.middleservice, self.message_queue, cycle_delay=self.cycle_delay)
+        thread_manager.start_event_loop()
+
+        time.sleep(2 * self.cycle_delay)
+
+        self.logger.info(f"------------Reading Queue of messages--------")
+        # Every gossiper thread has been joined, so all messages of the round are already queued
+        self.middleservice.read_queue(min_messages=0)
+        self.middleservice.save_state_file()
+
+        node_status = self.node_status
+        if self.checkpointer is not None:
+            self.checkpointer.save(self.middleservice, self.round_index)
+        if churn_events:
+            self._update_reachability()
+        self._record_spread()
+
+        self._redraw(node_status)
+        return node_status
+
+    def has_active_gossipers(self) -> bool:
+        """True while an online INFECTED node is left to spread the rumor."""
+        return len(self._active_gossipers()) > 0
+
+    def _reachable_susceptible(self) -> np.ndarray:
+        node_status = self.node_status
+        return self.reachable[:len(node_status)] & (node_status[:len(self.reachable)] == SUSCEPTIBLE)
+
+    def has_reachable_susceptible(self) -> bool:
+        """True while a SUSCEPTIBLE node can still be reached. Isolated nodes and other
+        components of the overlay never will, so they must not keep the loop running."""
+        return bool(np.any(self._reachable_susceptible()))
+
+    @property
+    def n_reachable(self) -> int:
+        """Nodes reached so far plus the SUSCEPTIBLE ones the gossipers can still reach."""
+        return int(np.count_nonzero(self.node_status != SUSCEPTIBLE)) + int(np.count_nonzero(self._reachable_susceptible()))
+
+    def run(self) -> dict:
+        """Runs the protocol until the frontier is empty or every reachable node is settled, and
+        returns a summary of the run."""
+        self.start()
+        # Start event loop -> GOSSIP PROTOCOL starts here!!!
+        while self.has_active_gossipers() and self.has_reachable_susceptible():
+            self.step()
+        return self.summary()
+
+    def summary(self) -> dict:
+        node_status = self.node_status
+        return {
+            'rounds': self.round_index,
+            'nodes': len(node_status),
+            'reached': int(np.count_nonzero(node_status != SUSCEPTIBLE)),
+            'reachable': self.n_reachable if self.reachable is not None else len(node_status),
+        }
+
+    def trace_record(self) -> dict:
+        """Infection forest of the run as parent and infection round lists indexed by node id."""
+        return {
+            'parent': self.middleservice.parent.tolist(),
+            'infection_round': self.middleservice.infection_round.tolist(),
+        }
+
+
+def sweep_run(params: dict) -> tuple:
+    """Runs one headless simulation of a sweep. Top-level so worker processes can unpickle it.
+    The result only depends on params, whichever worker runs it: runs with the same index share
+    their graph and seed node across fanout/repetitions values, which makes them comparable.
+
+    Returns:
+    - tuple: (summary, trace), the params merged with Simulation.summary() and the run's trace_record().
+    """
+    from graph.graph import RandomGraph
+
+    streams = RandomStreams(params['seed'], params['run'])
+    graph = RandomGraph(params['nodes'], params['edges'], seed=streams.seed_for(RandomStreams.TOPOLOGY),
+                        layout_seed=streams.seed_for(RandomStreams.LAYOUT))
+    simulation = Simulation(graph, None, params['fanout'], params['repetitions'], seed=params['seed'], run=params['run'])
+    summary = {**params, **simulation.run()}
+    return summary, simulation.trace_record()
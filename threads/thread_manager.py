@@ -1,46 +1,51 @@
-import threading
 import time
-from gossip.gossiper import Gossiper
+from concurrent.futures import ThreadPoolExecutor
+from gossip.gossiper import GossiperContext, GossiperView
+from utils.utils import INFECTED
+import numpy as np
 import logging
 
 
 
-def thread_function(node_id, gossiper_params, state_filepath, message_queue, middleware):
-    logging.info(f"Thread {node_id} started")
-    gossiper = Gossiper(node_id=node_id, state = gossiper_params['state'], message=gossiper_params['message'], fanout=gossiper_params['fanout'], repetitions=gossiper_params['repetitions'], state_filepath = state_filepath, msg_queue=message_queue, middleware=middleware)
-    gossiper.run()
-    logging.info(f"Thread {node_id} finished")
+def run_gossipers(node_ids, context):
+    """Runs the gossipers of a chunk of nodes one after the other. Views are created on the fly
+    and dropped right after their run, so only one per worker is alive at any time."""
+    for node_id in node_ids:
+        logging.info(f"Gossiper {node_id} started")
+        GossiperView(node_id, context).run()
+        logging.info(f"Gossiper {node_id} finished")
 
 class ThreadManager:
-    def __init__(self, middleware, message_queue):
-        self.gossiper_dict = middleware.state_file['gossipers']
+    def __init__(self, middleware, message_queue, cycle_delay: float = 1, workers: int = 8):
+        self.cycle_delay = cycle_delay
         self.logger = logging.getLogger('ThreadManager')
         self.msg_queue = message_queue
         self.state_filepath = middleware.state_file_path
         self.middleware = middleware
+        # A fixed pool instead of one thread per gossiper: fanout draws come from per node streams
+        # and the middleware applies messages in a fixed order, so results do not depend on it
+        self.workers = max(1, workers)
 
     def start_event_loop(self):
         self.logger.info("Starting event loop")
         try:
-            threads = []
-            for node_id, gossiper_params in self.gossiper_dict.items():
-                if gossiper_params['state'] == 'INFECTED':
-                    thread = threading.Thread(target=thread_function, args=(node_id, gossiper_params, self.state_filepath, self.msg_queue, self.middleware))
-                    thread.start()
-                    threads.append(thread)
-                    self.logger.info(f"Thread {thread.name} for node {node_id} started")
-
-            # Wait for all threads to complete before starting the next event cycle
-            for thread in threads:
-                thread.join()
-                self.logger.info(f"Thread {thread.name} joined")
+            # Vectorized scan of the shared state arrays, peers that left the overlay (churn) stop gossiping
+            node_ids = np.flatnonzero((self.middleware.node_state == INFECTED) & self.middleware.online).tolist()
+            context = GossiperContext(self.middleware.fanout, self.state_filepath, self.msg_queue, self.middleware)
+            chunks = [chunk for chunk in np.array_split(np.asarray(node_ids, dtype=np.int64), self.workers) if len(chunk)]
+
+            # Wait for all gossipers to complete before starting the next event cycle
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for _ in executor.map(run_gossipers, [chunk.tolist() for chunk in chunks], [context] * len(chunks)):
+                    pass
+            self.logger.info(f"{len(node_ids)} gossipers ran on {len(chunks)} worker threads")
 
             # Sleep for a bit before starting the next event cycle to simulate time between cycles
-            time.sleep(1)  # Sleep time could be adjusted as needed
+            time.sleep(self.cycle_delay)  # Headless runs pass 0, the render keeps its pacing
 
             self.logger.info("Event cycle completed, starting next cycle after delay")
 
         except KeyboardInterrupt:
             self.logger.info("Event loop stopped by user")
-        
-        self.logger.info("Event loop terminated")
\ No newline at end of file
+
+        self.logger.info("Event loop terminated")
@@ -1,13 +1,70 @@
 
 import numpy as np
 
+# Node states travel as compact uint8 codes in NumPy arrays indexed by node id.
+# STATE_NAMES[code] gives the human readable name, e.g. for logs.
+STATE_NAMES = ('SUSCEPTIBLE', 'INFECTED', 'REMOVED')
+SUSCEPTIBLE, INFECTED, REMOVED = 0, 1, 2
+STATE_DTYPE = np.uint8
 
-def ordered_list_from_dict(input_dict):
+
+def encode_states(states):
+    """Converts state names (or codes) to a uint8 code array."""
+    codes = {name: code for code, name in enumerate(STATE_NAMES)}
+    return np.asarray([codes.get(state, state) for state in states], dtype=STATE_DTYPE)
+
+
+def decode_states(node_state):
+    """Converts a uint8 code array back to a list of state names."""
+    return [STATE_NAMES[code] for code in np.asarray(node_state).tolist()]
+
+
+def changed_nodes(node_state, previous_state):
+    """Ids of the nodes whose state differs between two code arrays. Nodes missing from the
+    shorter `previous_state` (joined since) count as changed if they are not SUSCEPTIBLE."""
+    previous = np.full(len(node_state), SUSCEPTIBLE, dtype=STATE_DTYPE)
+    previous[:len(previous_state)] = previous_state[:len(node_state)]
+    return np.flatnonzero(node_state != previous)
+
+
+class RandomStreams:
+    """
+    Counter-based random streams: every (stream, round, node) key gets its own NumPy Philox
+    generator, derived from the run's seed without any shared state. A draw therefore never
+    depends on which thread, worker process or machine made the previous ones, and a run is
+    fully determined by (seed, run).
+
+    Parameters:
+    - seed (int): Master seed, a fresh one is drawn from OS entropy when None.
+    - run (int): Index of the run, so that the runs of a sweep sharing a seed stay independent.
+    """
+
+    # Stream ids, one per consumer of randomness
+    TOPOLOGY, LAYOUT, SEED_NODE, FANOUT, CHURN, RUMORS = range(6)
+
+    def __init__(self, seed: int = None, run: int = 0):
+        self.seed = int(np.random.SeedSequence().entropy) if seed is None else int(seed)
+        self.run = int(run)
+        # 128 bit Philox key mixed from (seed, run), the counter then encodes the stream key
+        self._key = np.random.SeedSequence([self.seed, self.run]).generate_state(2, dtype=np.uint64)
+
+    def generator(self, stream: int, round_index: int = 0, node_id: int = 0) -> np.random.Generator:
+        """Independent generator for one (stream, round, node) key. The low counter word is left at
+        0 for the generator's own draws, the three others hold the key."""
+        counter = np.array([0, stream, round_index, node_id], dtype=np.uint64)
+        return np.random.Generator(np.random.Philox(key=self._key, counter=counter))
+
+    def seed_for(self, stream: int, round_index: int = 0, node_id: int = 0) -> int:
+        """Integer seed for libraries that take one, e.g. networkx generators."""
+        return int(self.generator(stream, round_index, node_id).integers(2 ** 63))
+
+
+def ordered_list_from_dict(input_dict, field):
     # Sort the dictionary keys, which are strings but represent integers
     sorted_node_ids = sorted(input_dict.keys(), key=int)
     
-    # Create a list of 'state' values ordered by node_id
-    ordered_status = [input_dict[node_id]['state'] for node_id in sorted_node_ids]
+    # Create a list of `field` values ordered by node_id
+    ordered_status = [input_dict[node_id].get(field, -1) for node_id in sorted_node_ids]
     
     return ordered_status
 